@@ -109,6 +109,7 @@ class Aligner:
 	# so-called association matrix. Each cell stores the likelihood of a given letter-to-phoneme pairing.
 	def align(self, wordlist, scale = 40, test_words = ['auction', 'articulated', 'thanked', 'watched'], *args):		
 		import math
+		import numpy as np
 		# We stop iterating when curr_score stops changing.
 		curr_score = 0
 		# Add characters to represent the borders of words.
@@ -143,146 +144,162 @@ class Aligner:
 		# Print A^0.
 		#print(A_curr)
 
+		# Association matrices are dense arrays of letters by phonemes, over every symbol the padded words use
+		# (and the null phoneme, which alignment introduces).
+		letters = set(self.LETTER_PAD)
+		phonemes = set(self.PHONEME_PAD + '-')
+		for word in wordlist:
+			letters.update(word.letters)
+			phonemes.update(word.phonemes)
+		letter_index = {letter: i for i, letter in enumerate(sorted(letters))}
+		phoneme_index = {phoneme: j for j, phoneme in enumerate(sorted(phonemes))}
+		A_dense = np.zeros((len(letter_index), len(phoneme_index)))
+		for pair, value in A_curr.items():
+			A_dense[letter_index[pair[0]], phoneme_index[pair[1:]]] = value
+		A_curr = A_dense
+
+		# Suppress above the diagonal.
+		# Discourage injecting an unreasonable number of null phonemes.
+		# dampening amounts to, for e.g. dimension 6 x 6 (Not to scale)
+		#     l    E    t    -    R    -
+		# L  1.0, 0.5, 0.3, 0.3, 0.2, 0.1
+		# E  1.0, 1.0, 0.5, 0.3, 0.2, 0.2
+		# T  1.0, 1.0, 1.0, 0.5, 0.3, 0.2
+		# T  1.0, 1.0, 1.0, 1.0, 0.5, 0.3
+		# E  1.0, 1.0, 1.0, 1.0, 1.0, 0.5
+		# R  1.0, 1.0, 1.0, 1.0, 1.0, 1.0
+		# Every word of the same dimensions is dampened alike, so each shape's factors are computed once.
+		suppression_factors = {}
+		def suppression(rows, cols):
+			factors = suppression_factors.get((rows, cols), None)
+			if factors is None:
+				factors = np.array([[math.pow(abs( 1 / (max (0, j - i ) + 1 ) ), 3) for j in range(cols)] for i in range(rows)])
+				suppression_factors[(rows, cols)] = factors
+			return factors
+
+		# What each cell of D points to: its top left neighbor, the cell above, the cell to the left, or nothing (the path's end).
+		DIAGONAL, UP, LEFT, END = 0, 1, 2, 3
+		# D as Matrix.__str__ prints it, i.e. a tuple of coordinates per cell.
+		def pointers(D):
+			offsets = {DIAGONAL: (-1, -1), UP: (-1, 0), LEFT: (0, -1)}
+			return [[None if D[i, j] == END else (i + offsets[D[i, j]][0], j + offsets[D[i, j]][1]) \
+				for j in range(D.shape[1])] for i in range(D.shape[0])]
+
 		# Iterate alignment.
 		# Populates new and improved association matrix A_n.
 		# given B, a matrix of pairings' likelihoods (determined by previous iteration's association matrix).
 		# A_n is weighted by D's diagonal entries which describe the optimal path from the bottom right
 		# to the top left of the matrix.
-		def score(A_c, A_n, word):
-			# Constructs the phoneme string naively each iteration.
-			new_phonemes = ''
-			score = 0
+		# Scores a batch of words sharing the same numbers of letters and phonemes at once: each of B, C and D
+		# is one array over the whole batch. Returns each word's score, and the printouts of any test words' matrices.
+		def score(A_c, A_n, words):
+			rows = np.array([[letter_index[letter] for letter in word.letters] for word in words])
+			cols = np.array([[phoneme_index[phoneme] for phoneme in word.phonemes] for word in words])
+			last_j = cols.shape[1] - 1
 
 			# As per the paper, B's cells are determined by the current association matrix's scores.
-			B = self.Matrix(word.letters, word.phonemes, A_c)
+			B = A_c[rows[:, :, None], cols[:, None, :]] * suppression(rows.shape[1], cols.shape[1])
 			# The maximums will be propagated downward and rightward through C in pursuit of an optimal path.
-			C = self.Matrix(word.letters, word.phonemes)
+			C = np.zeros(B.shape)
 			# D's values describe this "Expectation Maximization-like" path.
-			D = self.Matrix(word.letters, word.phonemes)
-
-			# Suppress above the diagonal.
-			# Discourage injecting an unreasonable number of null phonemes.
-			for i, i_v in enumerate(word.letters):
-				for j, j_v in enumerate(word.phonemes):
-					suppression_factor = math.pow(abs( 1 / (max (0, j - i ) + 1 ) ), 3)
-					# dampening amounts to, for e.g. dimension 6 x 6 (Not to scale)
-					#     l    E    t    -    R    -
-					# L  1.0, 0.5, 0.3, 0.3, 0.2, 0.1
-					# E  1.0, 1.0, 0.5, 0.3, 0.2, 0.2
-					# T  1.0, 1.0, 1.0, 0.5, 0.3, 0.2
-					# T  1.0, 1.0, 1.0, 1.0, 0.5, 0.3
-					# E  1.0, 1.0, 1.0, 1.0, 1.0, 0.5
-					# R  1.0, 1.0, 1.0, 1.0, 1.0, 1.0
-
-					curr = B.value_at_index(i, j)
-					B.set_by_index(i, j, curr * suppression_factor)
+			D = np.empty(B.shape, dtype=np.int8)
+			# Topmost rows and leftmost columns are zeroes all the way through.
+			# D points either leftward or upward, whichever doesn't overflow.
+			# (See figure 1(b) of the paper.)
+			D[:, 0, :] = LEFT
+			D[:, :, 0] = UP
+			# Marks the path's end (while pointer[i][j] != END below).
+			D[:, 0, 0] = END
 
 			# Iterate through C, extending maximums downward and rightward and pointing D to the optimal neighbor.
-			for i, ch in enumerate(word.letters):
-				for j, ph in enumerate(word.phonemes):
-					# Beginning cases.
-					if i == 0 and j == 0:
-						# Marks the path's end (while cell != None below).
-						D.set_by_index(0, 0, None)
-						continue
-					# Topmost rows and leftmost columns are zeroes all the way through.
-					elif i == 0 or j == 0: 
-						# D points either leftward or upward, whichever doesn't overflow.
-						# (See figure 1(b) of the paper.)
-						upstream = (max(i - 1, 0), max(j - 1, 0))
-						D.set_by_index(i, j, upstream)
-						continue
-
-					# Three options for predecessors:
-					# 1) the cell above,
-					o1 = C.value_at_index(i - 1, j)
-					# 2) the cell to the left, or
-					o2 = 0 			# (Disallow null letters due to representation constraint.
-					# 3) the cell to the top left plus current.
-					o3 = C.value_at_index(i - 1, j - 1) + B.value_at_index(i, j)
-					
-					best = max((o1, o2, o3))
-
-					C.set_by_index(i, j, best)
-					if best == o3:
-						D.set_by_index(i, j, (i - 1, j - 1))
-					elif best == o2:
-						D.set_by_index(i, j, (i, j - 1)) # Again, this will never happen.
-					elif best == o1: 
-						D.set_by_index(i, j, (i - 1, j))
+			# Null letters are disallowed (due to representation constraint), so no cell depends on the cell to its left,
+			# and each row follows from the one above it at once.
+			for i in range(1, rows.shape[1]):
+				# Three options for predecessors:
+				# 1) the cell above,
+				o1 = C[:, i - 1, 1:]
+				# 2) the cell to the left (always 0), or
+				# 3) the cell to the top left plus current.
+				o3 = C[:, i - 1, :-1] + B[:, i, 1:]
+				C[:, i, 1:] = np.maximum(np.maximum(o1, 0), o3)
+				# Ties should favor vertical in every case EXCEPT the bottom right:
+				# For instance, double letters should be left-aligned: 'aardvark' should yield 'a-' and not '-a'
+				# Whereas in the bottom right, vertical movement would cause a character to map to the padding phoneme $.
+				diagonal = (o3 > o1)
+				diagonal[:, last_j - 1] = o3[:, last_j - 1] >= o1[:, last_j - 1]
+				D[:, i, 1:] = np.where(diagonal, DIAGONAL, UP)
 
-					# The above order erroneously prioritizes top left over vertical in case of ties.
-					# Ties should favor vertical in every case EXCEPT the bottom right:
-					# For instance, double letters should be left-aligned: 'aardvark' should yield 'a-' and not '-a'
-					# Whereas in the bottom right, vertical movement would cause a character to map to the padding phoneme $.
-					if (o1 == o3) and (j != len(word.phonemes) - 1):
-						# Rectify the tie.
-						D.set_by_index(i, j, (i - 1, j))
-
-			if word.letters in ['#{}#'.format(x) for x in test_words]:
-				print('Matrix B for {}'.format(word.letters))
-				print(B)
-				print('\n\n')
-				print('Matrix C for {}'.format(word.letters))
-				print(C)
-				print('\n\n')
-				print('Matrix D for {}'.format(word.letters))
-				print(D)
-				print('\n\n\n\n\n')
+			printouts = {}
+			for k, word in enumerate(words):
+				if word.letters in ['#{}#'.format(x) for x in test_words]:
+					printout = ''
+					for name, values in [('B', B[k].tolist()), ('C', C[k].tolist()), ('D', pointers(D[k]))]:
+						matrix = self.Matrix(word.letters, word.phonemes)
+						matrix.A = values
+						printout += 'Matrix {} for {}\n{}\n{}\n'.format(name, word.letters, matrix, '\n\n' if name != 'D' else '\n\n\n\n\n')
+					printouts[k] = printout
 
 			# Expectations set.
-			i = len(word.letters) - 1
-			j = len(word.phonemes) - 1
 			# Save max (bottom right) score.
-			score = C.value_at_index(i, j)
-			# Now trace backwards along path described by D, build new phonemes with nulls, and populate A_next.
-			cell = D.value_at_index(i, j)
-			while cell != None:
-				to_i, to_j = D.value_at_index(i, j)
-
-				diff_i = to_i - i
-				diff_j = to_j - j
-				if diff_i == -1 and diff_j == 0:
-					# Matrix D has an "arrow pointing down" at this cell.
-					# Therefore, the maximum "belongs" to the row at the letter before it. Inject a null phoneme.
-					new_phonemes = '-' + new_phonemes
-				elif diff_i == -1 and diff_j == -1:
-					# The maximum "belongs" to this cell's letter-phoneme pair.
-					letter, phoneme = D.labels_at_index(i, j)
-					new_phonemes =  phoneme + new_phonemes
-					A_n[letter + phoneme] = A_n.get(letter + phoneme, 0) + 1
-				elif diff_i == 0 and diff_j == -1 and i == 0:
-					# this should never happen beyond the topmost row of padding.
-					# Let's not count these moments.
-					break
-				else:
-					print('Starting at ({}, {}) and going to ({}, {}). Diff: {}, {}' \
-						.format(i, j, to_i, to_j, diff_i, diff_j))
-					print('The valid options have been exhausted, but none applied.')
-					exit()
-				# Prepare to iterate.
-				cell = D.value_at_index(to_i, to_j)
-				i = to_i
-				j = to_j
-			# Assign the new phonemes generated. The 0th character of padding has to be re-added, because
-			# the top left corner only occurs at the escape case of the while loop above.
-			word.phonemes = self.PHONEME_PAD + new_phonemes
-			return A_n, score
+			scores = C[:, -1, -1].tolist()
+			pairs_i = []
+			pairs_j = []
+			for k, word in enumerate(words):
+				# Constructs the phoneme string naively each iteration.
+				new_phonemes = ''
+				i = rows.shape[1] - 1
+				j = last_j
+				pointer = D[k].tolist()
+				# Now trace backwards along path described by D, build new phonemes with nulls, and populate A_next.
+				while pointer[i][j] != END:
+					if pointer[i][j] == UP:
+						# Matrix D has an "arrow pointing down" at this cell.
+						# Therefore, the maximum "belongs" to the row at the letter before it. Inject a null phoneme.
+						new_phonemes = '-' + new_phonemes
+						i -= 1
+					elif pointer[i][j] == DIAGONAL:
+						# The maximum "belongs" to this cell's letter-phoneme pair.
+						new_phonemes = word.phonemes[j] + new_phonemes
+						pairs_i.append(rows[k, i])
+						pairs_j.append(cols[k, j])
+						i -= 1
+						j -= 1
+					else:
+						# this should never happen beyond the topmost row of padding.
+						# Let's not count these moments.
+						break
+				# Assign the new phonemes generated. The 0th character of padding has to be re-added, because
+				# the top left corner only occurs at the escape case of the while loop above.
+				word.phonemes = self.PHONEME_PAD + new_phonemes
+			np.add.at(A_n, (pairs_i, pairs_j), 1)
+			return scores, printouts
 
 		prev_score = 0
 		iteration = 1
 		while prev_score != curr_score:
-			A_next = {}
+			A_next = np.zeros(A_curr.shape)
 			total = len(wordlist)
 			prev_score = curr_score
 			# Reset the score.
 			curr_score = 0
-			curr = 0
-			for word in wordlist:
-				# Score each word, adding total and returning new A.
-				A_next, score_ = score(A_curr, A_next, word)
-				curr_score += score_
-				curr += 1
+			# Every word is scored against A_curr alone, so words can be scored in any order: batch them by shape.
+			shapes = {}
+			for k, word in enumerate(wordlist):
+				shapes.setdefault((len(word.letters), len(word.phonemes)), []).append(k)
+			scores = [0]*total
+			printouts = {}
+			for batch in shapes.values():
+				batch_scores, batch_printouts = score(A_curr, A_next, [wordlist[k] for k in batch])
+				for n, k in enumerate(batch):
+					scores[k] = batch_scores[n]
+				for n in batch_printouts:
+					printouts[batch[n]] = batch_printouts[n]
+			# Total and report in the words' order.
+			for k, word in enumerate(wordlist):
+				curr_score += scores[k]
+				curr = k + 1
+				if k in printouts:
+					print(printouts[k], end='')
 				if curr % 10000 == 0 or word.letters in ['#{}#'.format(x) for x in test_words]:
 					# Print candidate word:
 					print('Word {} has phonemes {}'.format(word.letters, word.phonemes))
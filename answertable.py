@@ -0,0 +1,124 @@
+# Every word of a lexicon mapped to its pronunciation, in a memory-mapped, open-addressed hash table.
+# Words found in the lexicon need no lattice at all: looking one up costs a CRC, a probe or two, and a
+# slice of the mapped file, however large the lexicon. The file is built once, beside the other artifacts,
+# and is shared between processes through the page cache rather than copied into each of them.
+# Keys are unpadded words and values unpadded pronunciations, whichever padding the table was built from:
+#   table = AnswerTable.build(lexical_database_pad, 'Data/at_output')
+#   table['testing'], table['#testing#']    # both 'tEstIG-'
+# Layout, all little-endian:
+#   header   magic, slot count (a power of two), entry count
+#   slots    (crc32 of key, offset of its record), where offset 0 marks an empty slot
+#   records  key length, value length, key, value (latin-1)
+
+import struct
+from collections.abc import Mapping
+
+class AnswerTable(Mapping):
+	MAGIC = b'PBAANSW1'
+	HEADER = struct.Struct('<8sII')
+	SLOT = struct.Struct('<II')
+	RECORD = struct.Struct('<HH')
+	# At most half the slots are filled, keeping probe sequences short.
+	LOAD_FACTOR = 0.5
+
+	def __init__(self, path):
+		import mmap
+		self.path = path
+		with open(path, 'rb') as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, self.slot_count, self.entry_count = AnswerTable.HEADER.unpack_from(self.data, 0)
+		if magic != AnswerTable.MAGIC:
+			self.data.close()
+			raise ValueError('{} is not an answer table.'.format(path))
+		self.mask = self.slot_count - 1
+		self.records_start = AnswerTable.HEADER.size + self.slot_count*AnswerTable.SLOT.size
+
+	# Strips word boundary padding from a word or a pronunciation.
+	@staticmethod
+	def unpad(s):
+		if len(s) >= 2 and s[0] == s[-1] and s[0] in '#$':
+			return s[1:-1]
+		return s
+
+	# Writes lexical_database (padded or not) to path as an answer table, and opens it.
+	@staticmethod
+	def build(lexical_database, path):
+		import os
+		import zlib
+		entries = {}
+		for word, phonemes in lexical_database.items():
+			entries[AnswerTable.unpad(word).encode('latin-1')] = AnswerTable.unpad(phonemes).encode('latin-1')
+		slot_count = 8
+		while slot_count*AnswerTable.LOAD_FACTOR < len(entries):
+			slot_count *= 2
+		mask = slot_count - 1
+		slots = [(0, 0)]*slot_count
+		records = bytearray()
+		offset = AnswerTable.HEADER.size + slot_count*AnswerTable.SLOT.size
+		for key, value in entries.items():
+			crc = zlib.crc32(key)
+			i = crc & mask
+			while slots[i][1] != 0:
+				i = (i + 1) & mask
+			slots[i] = (crc, offset + len(records))
+			records += AnswerTable.RECORD.pack(len(key), len(value)) + key + value
+
+		temporary = path + '.tmp'
+		with open(temporary, 'wb') as f:
+			f.write(AnswerTable.HEADER.pack(AnswerTable.MAGIC, slot_count, len(entries)))
+			for slot in slots:
+				f.write(AnswerTable.SLOT.pack(*slot))
+			f.write(records)
+		os.replace(temporary, path)
+		return AnswerTable(path)
+
+	# The unpadded pronunciation of word (padded or not), or default if it isn't in the lexicon.
+	def get(self, word, default=None):
+		import zlib
+		try:
+			key = AnswerTable.unpad(word).encode('latin-1')
+		except UnicodeEncodeError:
+			return default
+		crc = zlib.crc32(key)
+		i = crc & self.mask
+		while True:
+			stored_crc, offset = AnswerTable.SLOT.unpack_from(self.data, AnswerTable.HEADER.size + i*AnswerTable.SLOT.size)
+			if offset == 0:
+				return default
+			if stored_crc == crc:
+				key_length, value_length = AnswerTable.RECORD.unpack_from(self.data, offset)
+				start = offset + AnswerTable.RECORD.size
+				if self.data[start:start + key_length] == key:
+					return self.data[start + key_length:start + key_length + value_length].decode('latin-1')
+			i = (i + 1) & self.mask
+
+	def __getitem__(self, word):
+		value = self.get(word)
+		if value is None:
+			raise KeyError(word)
+		return value
+
+	def __contains__(self, word):
+		return self.get(word) is not None
+
+	# Words in the order they were built from.
+	def __iter__(self):
+		offset = self.records_start
+		while offset < len(self.data):
+			key_length, value_length = AnswerTable.RECORD.unpack_from(self.data, offset)
+			start = offset + AnswerTable.RECORD.size
+			yield self.data[start:start + key_length].decode('latin-1')
+			offset = start + key_length + value_length
+
+	def __len__(self):
+		return self.entry_count
+
+	# Reopened from its file rather than copied, i.e. when sent to worker processes.
+	def __reduce__(self):
+		return (AnswerTable, (self.path,))
+
+	def close(self):
+		self.data.close()
+
+	def __repr__(self):
+		return 'AnswerTable({}, {} entries)'.format(self.path, self.entry_count)
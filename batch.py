@@ -0,0 +1,79 @@
+# Helpers for decoding long streams of words, shared by PbA and SbA.
+
+# Yields decode(word) for every word, in input order.
+# Words are read window at a time, so memory stays constant however long the stream is, and nothing
+# more is read until the caller has taken the current window's results. Within a window, each distinct
+# word is decoded only once. cache is any mapping from words to results (i.e. a dict, or a shelve for
+# reuse across runs): words found there are not decoded again, and newly decoded words are added to it.
+# Given imap, a function mapping a list of words to an iterator over their results in the same order
+# (i.e. a bound multiprocessing.Pool.imap), the window's distinct words are decoded through it instead.
+# Given key, a function from a word to the string it is cached under, one cache can hold results decoded
+# under several settings (i.e. PbA's padding) without them answering for each other.
+def stream(words, decode, cache=None, window=256, imap=None, key=None):
+	import itertools
+	if key is None:
+		key = lambda word: word
+	words = iter(words)
+	while True:
+		batch = list(itertools.islice(words, window))
+		if not batch:
+			return
+		ready = {}
+		pending = []
+		# In order of first appearance.
+		for word in dict.fromkeys(batch):
+			if cache is not None and key(word) in cache:
+				ready[word] = cache[key(word)]
+			else:
+				pending.append(word)
+		if imap is not None:
+			decoded = imap(pending)
+		else:
+			decoded = (decode(word) for word in pending)
+
+		# Yield each word as soon as it and every word before it are ready.
+		position = 0
+		for word, result in zip(pending, decoded):
+			ready[word] = result
+			if cache is not None:
+				cache[key(word)] = result
+			while position < len(batch) and batch[position] in ready:
+				yield ready[batch[position]]
+				position += 1
+		while position < len(batch):
+			yield ready[batch[position]]
+			position += 1
+
+# Raises TimeoutError in the calling (main) thread if its block runs longer than seconds. None never times out.
+# Relies on SIGALRM, so limits are only available on Unix, from the main thread (see supported); elsewhere,
+# entering a limit raises RuntimeError rather than silently running without one.
+#   with time_limit(2):
+#       results = pl.find_all_paths()
+class time_limit:
+	def __init__(self, seconds):
+		self.seconds = seconds
+
+	@staticmethod
+	def supported():
+		import signal
+		import threading
+		return hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+
+	@staticmethod
+	def expire(signum, frame):
+		raise TimeoutError()
+
+	def __enter__(self):
+		import signal
+		if self.seconds is not None:
+			if not time_limit.supported():
+				raise RuntimeError('Timeouts need SIGALRM and the main thread, so are unavailable here; run without one.')
+			self.previous = signal.signal(signal.SIGALRM, time_limit.expire)
+			signal.setitimer(signal.ITIMER_REAL, self.seconds)
+		return self
+
+	def __exit__(self, *exc):
+		import signal
+		if self.seconds is not None:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			signal.signal(signal.SIGALRM, self.previous)
@@ -0,0 +1,8 @@
+# Reproducible throughput and latency benchmarks for PbA (optimized and legacy matchers) and SbA.
+# Each path decodes the same fixed word sets (see words.py) in a fresh process against a reduced lexicon,
+# and the run is reported as JSON: words per second, per-stage latency percentiles, lattice sizes and
+# peak memory, per path and per stratum. From the repository's root:
+#   python -m benchmark --skip-every 20 --output Data/benchmark.json
+#   python -m benchmark --paths optimized sba --repeat 3 --tracemalloc
+
+from benchmark.words import WORD_SETS
@@ -0,0 +1,135 @@
+# Runs the benchmark (see __init__.py). Every path is measured in its own freshly spawned process, so
+# that no path inherits another's loaded artifacts, and peak memory belongs to that path alone.
+
+# beam is the optimized matcher, searching lattices by beam. sba-legacy is SbA partial matching one entry at a time,
+# and sba-compact is SbA over letters alone (see SyllabifierByAnalogy.compact).
+PATHS = ['optimized', 'legacy', 'sba', 'beam', 'sba-legacy', 'sba-compact']
+
+# Returns a function decoding one word to a Pronunciation along path, by analogy only.
+def decoder(path, settings):
+	if path in ('sba', 'sba-legacy', 'sba-compact'):
+		from sba import SyllabifierByAnalogy
+		sba = SyllabifierByAnalogy(settings['lexicon'], matcher='legacy' if path == 'sba-legacy' else 'optimized', \
+			skip_every=settings['skip_every'], offset=settings['offset'], output_folder=settings['folder'], compact=path == 'sba-compact')
+		return lambda word: sba.decode(word, timeout=settings['timeout'])
+	from pba import PronouncerByAnalogy
+	beam_width = settings['beam_width'] if path == 'beam' else None
+	pba = PronouncerByAnalogy(settings['folder'], settings['dataset'], settings['skip_every'], settings['offset'], pad=True, \
+		matcher='legacy' if path == 'legacy' else 'optimized', beam_width=beam_width)
+	# Words in the reduced lexicon would otherwise skip the lattice altogether (see PronouncerByAnalogy.decode).
+	return lambda word: pba.decode(word, True, timeout=settings['timeout'], lookup=False)
+
+# A Metrics summary, with the wall-clock seconds its words took and the resulting throughput.
+def report(metrics, seconds):
+	summary = metrics.summary()
+	summary['seconds'] = seconds
+	summary['words_per_second'] = summary['words']/seconds if seconds > 0 else None
+	return summary
+
+# Loads and decodes every word set along path. Runs in a worker process.
+def measure(path, settings):
+	import contextlib
+	import resource
+	import sys
+	import time
+	import tracemalloc
+	from metrics import Metrics
+	from benchmark.words import WORD_SETS
+	# Keep stdout for the report.
+	with contextlib.redirect_stdout(sys.stderr):
+		if settings['tracemalloc']:
+			tracemalloc.start()
+		time_before = time.perf_counter()
+		decode = decoder(path, settings)
+		# Also builds whatever the path loads lazily (i.e. indices), so the word sets measure decoding alone.
+		decode('the')
+		load_seconds = time.perf_counter() - time_before
+
+		overall = Metrics()
+		strata = {}
+		time_before = time.perf_counter()
+		for stratum, words in WORD_SETS.items():
+			metrics = Metrics()
+			time_before_stratum = time.perf_counter()
+			for _ in range(settings['repeat']):
+				for word in words:
+					event = decode(word).event()
+					metrics(event)
+					overall(event)
+			strata[stratum] = report(metrics, time.perf_counter() - time_before_stratum)
+		record = report(overall, time.perf_counter() - time_before)
+		record['load_seconds'] = load_seconds
+		record['strata'] = strata
+		# Kilobytes on Linux, bytes on macOS.
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		record['peak_rss_bytes'] = peak if sys.platform == 'darwin' else peak*1024
+		if settings['tracemalloc']:
+			record['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+	return record
+
+# What the numbers were measured on.
+def environment():
+	import os
+	import platform
+	import subprocess
+	import sys
+	try:
+		commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+	try:
+		import numpy
+		numpy_version = numpy.__version__
+	except ImportError:
+		numpy_version = None
+	return {'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count(), \
+		'numpy': numpy_version, 'commit': commit}
+
+def main(argv=None):
+	import argparse
+	import json
+	import multiprocessing as mp
+	import sys
+	import time
+	from batch import time_limit
+	from benchmark.words import WORD_SETS
+	parser = argparse.ArgumentParser(prog='python -m benchmark', description='Measure PbA and SbA throughput, latency and memory.')
+	parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS, help='PbA matchers (optimized, legacy), SbA matchers (sba, sba-legacy, sba-compact), and/or beam search.')
+	parser.add_argument('--dataset', default='output', help='PbA: dataset name within Preprocessing/Out/, without ".txt".')
+	parser.add_argument('--folder', default='Data/', help='Where loaded and optimized artifacts are cached.')
+	parser.add_argument('--lexicon', default='Preprocessing/Out/output.txt', help='SbA: the lexicon file.')
+	parser.add_argument('--skip-every', type=int, default=20, help='Keep every nth lexicon entry (-1 keeps them all).')
+	parser.add_argument('--offset', type=int, default=0)
+	parser.add_argument('--repeat', type=int, default=1, help='Decode every word set this many times.')
+	# Timeouts need SIGALRM, so there is no default limit where it is missing (i.e. Windows).
+	parser.add_argument('--timeout', type=float, default=10 if time_limit.supported() else None, help='Give up on a word after this many seconds.')
+	parser.add_argument('--beam-width', type=int, default=16, help='The beam path\'s width.')
+	parser.add_argument('--tracemalloc', action='store_true', help='Also report peak traced Python allocations (slower).')
+	parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+	args = parser.parse_args(argv)
+	if args.beam_width < 1:
+		parser.error('--beam-width must be at least 1.')
+	if args.timeout is not None and not time_limit.supported():
+		parser.error('--timeout needs SIGALRM, which this platform lacks.')
+
+	settings = {'dataset': args.dataset, 'folder': args.folder, 'lexicon': args.lexicon, 'skip_every': args.skip_every, \
+		'offset': args.offset, 'repeat': args.repeat, 'timeout': args.timeout, 'beam_width': args.beam_width, \
+		'tracemalloc': args.tracemalloc}
+	results = {}
+	context = mp.get_context('spawn')
+	for path in args.paths:
+		print('Benchmarking {}...'.format(path), file=sys.stderr)
+		with context.Pool(1) as pool:
+			results[path] = pool.apply(measure, (path, settings))
+		print('{}: {:.2f} words/second.'.format(path, results[path]['words_per_second']), file=sys.stderr)
+
+	report = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'settings': settings, 'environment': environment(), \
+		'word_sets': WORD_SETS, 'results': results}
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		json.dump(report, sys.stdout, indent=1)
+		print()
+	return 0
@@ -0,0 +1,18 @@
+# The fixed words every benchmark run decodes, stratified by length and by how hard their lattices are.
+# Changing a list changes what the numbers mean, so add a stratum rather than editing one.
+
+WORD_SETS = {
+	# Three or four letters: few arcs, a handful of paths.
+	'short': ['cat', 'dog', 'run', 'ship', 'blue', 'fish', 'jump', 'tree'],
+	# Six to eight letters.
+	'medium': ['window', 'garden', 'picture', 'teacher', 'morning', 'quickly', 'brother', 'kitchen'],
+	# Eleven to fourteen letters: the breadth-first search starts to dominate.
+	'long': ['authentication', 'international', 'responsibility', 'understanding', 'communication', \
+		'temperature', 'independent', 'photographer'],
+	# Words already known to stress the decoder:
+	#   solsolsolsolsol        repeats a well-attested trigram, so shortest paths multiply
+	#   supercalifragilisticexpialidocious   long enough that the search is cut off or times out
+	#   qzqzxz                 bigrams unseen in the lexicon, so every gap must be patched
+	#   mississippi, rhythms   repeated letters, and no vowels to anchor on
+	'pathological': ['solsolsolsolsol', 'supercalifragilisticexpialidocious', 'qzqzxz', 'mississippi', 'rhythms'],
+}
@@ -0,0 +1,117 @@
+# Streams words through PbA or SbA, writing one result per word to stdout as they are ready.
+# Words are read lazily (whitespace-separated, from a file or stdin), decoded a window at a time with
+# repeats decoded once, and written in input order, so memory stays flat however long the input is.
+#   python cli.py pba words.txt --dataset output --format jsonl > pronunciations.jsonl
+#   cat corpus.txt | python cli.py pba --processes 4 --cache Data/pba-cache --timeout 5
+#   python cli.py sba words.txt --lexicon Preprocessing/Out/output.txt
+# PbA answers words already in its lexicon from the lexicon's answer table (strategy "lexicon"), unless
+# given --no-lookup, and decodes only the rest by analogy.
+# TSV lines are "word<TAB>result<TAB>strategy<TAB>error", leaving result and strategy empty on error.
+# JSONL lines also carry the normalized word, per-stage timings and (with --alternatives) every strategy's result.
+# Progress messages from the pronouncer go to stderr, as do (with --debug) its per-stage log messages, and
+# (with --metrics) a summary of every stage's timing percentiles and lattice sizes once the input is done.
+
+# The settings a cache's results depend on. A cache written under other settings is refused.
+def configuration(args):
+	if args.mode == 'pba':
+		return {'mode': 'pba', 'dataset': args.dataset, 'skip_every': args.skip_every, 'offset': args.offset, \
+			'pad': not args.no_pad, 'matcher': args.matcher, 'lookup': not args.no_lookup, 'beam_width': args.beam_width}
+	return {'mode': 'sba', 'lexicon': args.lexicon, 'skip_every': args.skip_every, 'offset': args.offset, 'matcher': args.matcher, \
+		'beam_width': args.beam_width, 'compact': args.compact}
+
+def words_from(f):
+	for line in f:
+		for word in line.split():
+			yield word
+
+def format_result(word, result, output_format, alternatives=False):
+	import json
+	if output_format == 'tsv':
+		if result.error is not None:
+			return '{}\t\t\t{}\n'.format(word, result.error)
+		return '{}\t{}\t{}\t\n'.format(word, result.pronunciation, result.strategy)
+	record = {'word': word, 'normalized': result.word, 'pronunciation': result.pronunciation, 'strategy': result.strategy, \
+		'error': result.error, 'timings': result.timings}
+	if alternatives:
+		record['alternatives'] = result.alternatives
+	return json.dumps(record) + '\n'
+
+def main(argv=None):
+	import argparse
+	import contextlib
+	import itertools
+	import logging
+	import shelve
+	import sys
+	from batch import time_limit
+	from metrics import Metrics
+	parser = argparse.ArgumentParser(description='Pronounce or syllabify a stream of words by analogy.')
+	parser.add_argument('mode', choices=['pba', 'sba'], help='Pronunciation (pba) or syllabification (sba) by analogy.')
+	parser.add_argument('input', nargs='?', default='-', help='File of whitespace-separated words, or - for stdin.')
+	parser.add_argument('--dataset', default='output', help='PbA: dataset name within Preprocessing/Out/, without ".txt".')
+	parser.add_argument('--folder', default='Data/', help='Where loaded and optimized artifacts are cached.')
+	parser.add_argument('--skip-every', type=int, default=-1)
+	parser.add_argument('--offset', type=int, default=0)
+	parser.add_argument('--lexicon', default='Preprocessing/Out/output.txt', help='SbA: the lexicon file.')
+	parser.add_argument('--no-pad', action='store_true', help='PbA: pronounce without word boundary padding.')
+	parser.add_argument('--no-lookup', action='store_true', help='PbA: decode words by analogy even if they are in the lexicon.')
+	parser.add_argument('--matcher', default='optimized', help='optimized (default) or legacy, or for SbA also vectorized.')
+	parser.add_argument('--compact', action='store_true', help='SbA: match letters alone, marked with their junctures (faster, less accurate).')
+	parser.add_argument('--beam-width', type=int, help='Keep only this many partial paths per lattice node, bounding each word\'s search.')
+	parser.add_argument('--strategy', default='10100', help='The result to report (see Lattice.decide).')
+	parser.add_argument('--processes', type=int, help='Decode across this many worker processes.')
+	parser.add_argument('--timeout', type=float, help='Give up on a word after this many seconds.')
+	parser.add_argument('--cache', help='Path of a shelve to reuse results from, and add results to.')
+	parser.add_argument('--window', type=int, default=256, help='Words read (and deduplicated) at a time.')
+	parser.add_argument('--format', choices=['tsv', 'jsonl'], default='tsv')
+	parser.add_argument('--alternatives', action='store_true', help='JSONL: include every strategy\'s result.')
+	parser.add_argument('--metrics', action='store_true', help='Summarize per-stage timings and lattice sizes on stderr.')
+	parser.add_argument('--debug', action='store_true', help='Log each stage\'s progress to stderr.')
+	args = parser.parse_args(argv)
+	if args.matcher not in (['optimized', 'legacy'] if args.mode == 'pba' else ['optimized', 'legacy', 'vectorized']):
+		parser.error('Unknown {} matcher {}.'.format(args.mode, args.matcher))
+	if args.beam_width is not None and args.beam_width < 1:
+		parser.error('--beam-width must be at least 1.')
+	if args.timeout is not None and not time_limit.supported():
+		parser.error('--timeout needs SIGALRM, which this platform lacks.')
+
+	if args.debug:
+		logging.basicConfig(level=logging.DEBUG, format='%(message)s', stream=sys.stderr)
+	# Fed from results rather than installed as a hook, so that words decoded by worker processes count too.
+	metrics = Metrics() if args.metrics else None
+	out = sys.stdout
+	with contextlib.ExitStack() as stack:
+		# Keep stdout for results alone.
+		stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+		f = sys.stdin if args.input == '-' else stack.enter_context(open(args.input, 'r', encoding='latin-1'))
+		cache = None
+		if args.cache is not None:
+			cache = stack.enter_context(shelve.open(args.cache))
+			if cache.setdefault('__configuration__', configuration(args)) != configuration(args):
+				parser.error('{} holds results for {}.'.format(args.cache, cache['__configuration__']))
+
+		# One copy of the words to decode, the other to label the results with. They never drift more than a window apart.
+		words, labels = itertools.tee(words_from(f))
+		if args.mode == 'pba':
+			from pba import PronouncerByAnalogy
+			pad = not args.no_pad
+			pba = stack.enter_context(PronouncerByAnalogy(args.folder, args.dataset, args.skip_every, args.offset, pad=pad, matcher=args.matcher, beam_width=args.beam_width))
+			if args.processes is not None:
+				pba.word_pool(pad, args.processes)
+			results = pba.pronounce_batch(words, pad, args.strategy, cache, args.processes is not None, args.window, args.timeout, not args.no_lookup)
+		else:
+			from sba import SyllabifierByAnalogy
+			sba = SyllabifierByAnalogy(args.lexicon, matcher=args.matcher, skip_every=args.skip_every, offset=args.offset, beam_width=args.beam_width, \
+				output_folder=args.folder, compact=args.compact)
+			results = sba.syllabify_batch(words, args.strategy, cache, args.processes, args.window, args.timeout)
+		for word, result in zip(labels, results):
+			out.write(format_result(word, result, args.format, args.alternatives))
+			if metrics is not None:
+				metrics(result.event())
+	if metrics is not None:
+		metrics.print_summary(sys.stderr)
+	return 0
+
+if __name__ == "__main__":
+	import sys
+	sys.exit(main())
@@ -0,0 +1,168 @@
+# Running totals for leave-one-out cross-validation, shared by PbA and SbA.
+# Each dict maps a strategy name (or an error's description) to the titular stat.
+# "Units" are what the domain scores per symbol: phonemes for PbA, junctures for SbA.
+
+from lattice import ERRORS
+
+class Tally:
+	# unit_symbols restricts which output symbols count as units (None counts every symbol).
+	def __init__(self, unit_name='phonemes', unit_symbols=None):
+		self.unit_name = unit_name
+		self.unit_symbols = unit_symbols
+		self.words_correct = {}
+		self.words_total = {}
+		self.units_correct = {}
+		self.units_total = {}
+
+	# Log instance of error code. Returns the line to append to the results file.
+	def count_error(self, code):
+		description = ERRORS[code]
+		self.words_total[description] = self.words_total.get(description, 0) + 1
+		return '{}, {}\n\n'.format(description, self.words_total.get(description, 0))
+
+	# results maps each strategy to its output string.
+	def add(self, results, ground_truth):
+		for key in results:
+			# Iterate words for which this trial had a result.
+			self.words_total[key] = self.words_total.get(key, 0) + 1
+			# Evaluate that result.
+			if results[key] == ground_truth:
+				self.words_correct[key] = self.words_correct.get(key, 0) + 1
+			# Iterate units for which this trial had a result.
+			for index, ch in enumerate(results[key]):
+				if self.unit_symbols is not None and ch not in self.unit_symbols:
+					continue
+				# Total always iterates.
+				self.units_total[key] = self.units_total.get(key, 0) + 1
+				if index < len(ground_truth) and ch == ground_truth[index]:
+					# Correct only when correct.
+					self.units_correct[key] = self.units_correct.get(key, 0) + 1
+
+	# record is one trial's line in a results journal (see Journal).
+	def add_record(self, record):
+		if 'error' in record:
+			self.count_error(record['error'])
+		else:
+			self.add(record['results'], record['ground_truth'])
+
+	# Adds another tally's counts (i.e. from another worker) into this one.
+	def merge(self, other):
+		for mine, theirs in [(self.words_correct, other.words_correct), (self.words_total, other.words_total), \
+			(self.units_correct, other.units_correct), (self.units_total, other.units_total)]:
+			for key in theirs:
+				mine[key] = mine.get(key, 0) + theirs[key]
+
+	# The results file's line for this strategy.
+	def line(self, key):
+		return '{}, {}, {}, {}, {}\n'.format(key, self.words_correct.get(key, 0), self.words_total.get(key, 0), \
+			self.units_correct.get(key, 0), self.units_total.get(key, 0))
+
+	# i.e. "10100: 500/800 words correct (62.50%), 5000/6000 phonemes correct (83.33%)"
+	def describe(self, key):
+		return '{}/{} words correct ({:.2f}%), {}/{} {} correct ({:.2f}%)'.format( \
+			self.words_correct.get(key, 0), self.words_total.get(key, 0), 100*self.words_correct.get(key, 0)/max(self.words_total.get(key, 0), 1), \
+			self.units_correct.get(key, 0), self.units_total.get(key, 0), self.unit_name, 100*self.units_correct.get(key, 0)/max(self.units_total.get(key, 0), 1))
+
+	# JSON-friendly counters, for checkpoints.
+	def state(self):
+		return {'unit_name': self.unit_name, 'unit_symbols': self.unit_symbols, \
+			'words_correct': self.words_correct, 'words_total': self.words_total, \
+			'units_correct': self.units_correct, 'units_total': self.units_total}
+
+	@staticmethod
+	def from_state(state):
+		tally = Tally(state['unit_name'], state['unit_symbols'])
+		tally.words_correct = dict(state['words_correct'])
+		tally.words_total = dict(state['words_total'])
+		tally.units_correct = dict(state['units_correct'])
+		tally.units_total = dict(state['units_total'])
+		return tally
+
+	def print_summary(self):
+		for key in self.words_total:
+			print('{}: {}'.format(key, self.describe(key)))
+
+# A resumable cross-validation run. Each completed trial is appended to path as one JSON line:
+#   {"trial": 12, "word": "#test#", "ground_truth": "#tEst#", "results": {"10100": "#tEst#", ...}}
+# or, when no pronunciation was found, {"trial": ..., "word": ..., "ground_truth": ..., "error": code}.
+# Every checkpoint_every trials, the tally and the journal's length are saved to path + '.checkpoint'.
+# Reopening the same path restores the tally from the checkpoint, replays any trials journaled after it,
+# drops a final line cut short by a crash, and reports the trial to resume from.
+class Journal:
+	def __init__(self, path, tally, checkpoint_every=100):
+		self.path = path
+		self.checkpoint_path = path + '.checkpoint'
+		self.tally = tally
+		self.checkpoint_every = checkpoint_every
+		self.next_trial = None
+		self.offset = 0
+		self.since_checkpoint = 0
+		self.f = None
+
+	# Opens the journal, restoring any previous progress. Returns the trial to continue from.
+	def resume(self, start=0):
+		import json
+		import os
+		self.next_trial = start
+		if os.path.exists(self.checkpoint_path):
+			with open(self.checkpoint_path, 'r', encoding='latin-1') as f:
+				checkpoint = json.load(f)
+			self.tally = Tally.from_state(checkpoint['tally'])
+			self.next_trial = checkpoint['next_trial']
+			self.offset = checkpoint['offset']
+		if os.path.exists(self.path):
+			replayed = 0
+			with open(self.path, 'rb') as f:
+				f.seek(self.offset)
+				for line in f:
+					if not line.endswith(b'\n'):
+						# Torn write.
+						break
+					record = json.loads(line.decode('latin-1'))
+					self.tally.add_record(record)
+					self.next_trial = record['trial'] + 1
+					self.offset += len(line)
+					replayed += 1
+			if replayed:
+				print('Replayed {} trials journaled after the last checkpoint.'.format(replayed))
+			with open(self.path, 'r+b') as f:
+				f.truncate(self.offset)
+		if self.next_trial != start:
+			print('Resuming {} from trial #{}.'.format(self.path, self.next_trial))
+		self.f = open(self.path, 'ab')
+		return self.next_trial
+
+	def write(self, record):
+		import json
+		line = (json.dumps(record) + '\n').encode('latin-1')
+		self.f.write(line)
+		self.f.flush()
+		self.tally.add_record(record)
+		self.offset += len(line)
+		self.next_trial = record['trial'] + 1
+		self.since_checkpoint += 1
+		if self.since_checkpoint >= self.checkpoint_every:
+			self.checkpoint()
+
+	# Written to a temporary file first so that a crash mid-write leaves the previous checkpoint intact.
+	def checkpoint(self):
+		import json
+		import os
+		os.fsync(self.f.fileno())
+		temporary_path = self.checkpoint_path + '.tmp'
+		with open(temporary_path, 'w', encoding='latin-1') as f:
+			json.dump({'next_trial': self.next_trial, 'offset': self.offset, 'tally': self.tally.state()}, f)
+		os.replace(temporary_path, self.checkpoint_path)
+		self.since_checkpoint = 0
+
+	def close(self):
+		if self.f is not None:
+			self.checkpoint()
+			self.f.close()
+			self.f = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
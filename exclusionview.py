@@ -0,0 +1,30 @@
+# A read-only view of a lexical (or substring) database that hides some of its words.
+# Leave-one-out cross-validation used to copy all but one entry into a fresh dict per trial. Wrapping the
+# database instead costs nothing up front: lookups, membership tests, and iteration (in the database's
+# own order) simply skip the excluded words.
+
+from collections.abc import Mapping
+
+class ExclusionView(Mapping):
+	def __init__(self, database, excluded=()):
+		self.database = database
+		self.excluded = frozenset(excluded)
+
+	def __getitem__(self, key):
+		if key in self.excluded:
+			raise KeyError(key)
+		return self.database[key]
+
+	def __contains__(self, key):
+		return key not in self.excluded and key in self.database
+
+	def __iter__(self):
+		if not self.excluded:
+			return iter(self.database)
+		return (key for key in self.database if key not in self.excluded)
+
+	def __len__(self):
+		return len(self.database) - sum(1 for key in self.excluded if key in self.database)
+
+	def __repr__(self):
+		return 'ExclusionView({} entries, excluding {})'.format(len(self.database), sorted(self.excluded))
@@ -0,0 +1,97 @@
+# Pronunciation and Syllabification By Analogy, in one pass.
+# Every lexicon entry's phonemes and syllable boundaries are aligned to the same letters, so both fit in one
+# junctured representation: letters' positions carry phonemes, and junctures' positions carry boundaries, i.e.
+#   "#t*e*s*t#" -> "$t*E|s*t$"
+# One index, one lattice and one search then decode both, where PbA and SbA would each build and search their own.
+#   joint = PronouncerAndSyllabifierByAnalogy()
+#   pronunciation, syllabification = joint.pronounce_and_syllabify('testing')
+#   for pronunciation, syllabification in joint.pronounce_and_syllabify_batch(words, processes=4): ...
+# SbA's own methods (syllabify, decode, syllabify_batch) return the syllabification alone, so the class stands in
+# for a SyllabifierByAnalogy. Their *_representation counterparts return the joint results themselves.
+
+from sba import SyllabifierByAnalogy
+
+class PronouncerAndSyllabifierByAnalogy(SyllabifierByAnalogy):
+	PREFIX = 'joint'
+	RESULTS = 'Joint_Results'
+
+	# As SyllabifierByAnalogy, which see. There is no compact joint representation.
+	def __init__(self, path="Preprocessing/Out/output.txt", verbose=False, matcher='optimized', skip_every=-1, offset=0, beam_width=None, \
+		output_folder='Data/'):
+		super().__init__(path, verbose, matcher, skip_every, offset, beam_width, output_folder)
+
+	def settings(self):
+		settings = super().settings()
+		del settings['compact']
+		return settings
+
+	# Swaps the junctured entry's letters for their phonemes.
+	def represent(self, junctured_key, junctured_entry, phonemes):
+		symbols = list(junctured_entry[1:-1])
+		symbols[::2] = phonemes
+		return junctured_key, '${}$'.format(''.join(symbols))
+
+	# Phonemes and junctures alike are scored, so a word is correct only when both its outputs are.
+	def tally(self):
+		from evaluation import Tally
+		return Tally('symbols')
+
+	# Splits a joint result for junctured key into its pronunciation (padded, as PbA's) and syllabification.
+	# Marks other than '|' at junctures (i.e. the '-' of gap patching) are read as no boundary.
+	@staticmethod
+	def split(key, joint):
+		symbols = joint[1:-1]
+		syllabification = key[1]
+		for letter, mark in zip(key[3:-1:2], symbols[1::2]):
+			syllabification += ('|' if mark == '|' else '*') + letter
+		return '${}$'.format(symbols[::2]), '#{}#'.format(syllabification)
+
+	# Decodes input_word once (see SyllabifierByAnalogy.decode), returning a PronouncerByAnalogy.Pronunciation
+	# of its pronunciation and another of its syllabification. Both carry the one decoding's timings and sizes.
+	def pronounce_and_syllabify(self, input_word, strategy='10100', timeout=None):
+		return PronouncerAndSyllabifierByAnalogy.split_result(self.key(input_word), self.decode_representation(input_word, strategy, timeout))
+
+	# The syllabification of pronounce_and_syllabify, as SyllabifierByAnalogy would decode it.
+	def decode(self, input_word, strategy='10100', timeout=None):
+		return self.pronounce_and_syllabify(input_word, strategy, timeout)[1]
+
+	# The syllabification of each strategy's joint result, as SyllabifierByAnalogy would syllabify it.
+	def syllabify(self, input_word, trimmed_databases=None, verbose=False):
+		results = self.syllabify_representation(input_word, trimmed_databases, verbose)
+		if isinstance(results, dict):
+			key = self.key(input_word)
+			# Strategies may share a candidate, so split each only once.
+			split = set()
+			for result in results.values():
+				if id(result) not in split:
+					result.pronunciation = PronouncerAndSyllabifierByAnalogy.split(key, result.pronunciation)[1]
+					split.add(id(result))
+		return results
+
+	# As SyllabifierByAnalogy.syllabify_batch, which see, but yielding the (pronunciation, syllabification) pairs of
+	# pronounce_and_syllabify. A cache holds whole joint results, so it serves either batch method.
+	def pronounce_and_syllabify_batch(self, words, strategy='10100', cache=None, processes=None, window=256, timeout=None):
+		for result in super().syllabify_batch(words, strategy, cache, processes, window, timeout):
+			yield PronouncerAndSyllabifierByAnalogy.split_result(self.key(result.word), result)
+
+	# Yields only the syllabification of each pair, as SyllabifierByAnalogy would.
+	def syllabify_batch(self, words, strategy='10100', cache=None, processes=None, window=256, timeout=None):
+		for pronunciation, syllabification in self.pronounce_and_syllabify_batch(words, strategy, cache, processes, window, timeout):
+			yield syllabification
+
+	@staticmethod
+	def split_result(key, result):
+		from pba import PronouncerByAnalogy
+		if result.error is not None:
+			return result, result
+		alternatives = {strategy: PronouncerAndSyllabifierByAnalogy.split(key, joint) for strategy, joint in result.alternatives.items()}
+		return tuple(PronouncerByAnalogy.Pronunciation(result.word, result.strategy, alternatives[result.strategy][i], \
+			{strategy: alternatives[strategy][i] for strategy in alternatives}, result.timings, sizes=result.sizes) for i in range(2))
+
+if __name__ == "__main__":
+	import logging
+	# Show each stage's progress and timings.
+	logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+	joint = PronouncerAndSyllabifierByAnalogy()
+	for word in ['testing', 'mandatory', 'authoritative']:
+		print(*joint.pronounce_and_syllabify(word))
@@ -1,5 +1,9 @@
 # A representation of possible mappings from a word's spelling to some alternate domain (pronunciation or syllabification).
 
+import logging
+
+logger = logging.getLogger(__name__)
+
 NO_PATHS_FOUND = 999
 SEARCHED_TOO_LONG = 998
 WORD_TOO_SHORT = 997
@@ -81,6 +85,8 @@ class Lattice:
 			self.path_structure_standard_deviation = 0
 			self.weakest_link = 0
 			self.number_of_different_symbols = 0
+			# Rank fusion looks candidates up thousands of times, so the hash of their arcs is kept until they change.
+			self.arcs_hash = None
 			if arcs == None:
 				return
 			for arc in arcs:
@@ -98,12 +104,15 @@ class Lattice:
 		def __str__(self):
 			return self.pronunciation
 		def __hash__(self):
-			return hash(tuple([arc for arc in self.arcs]))
+			if self.arcs_hash is None:
+				self.arcs_hash = hash(tuple([arc for arc in self.arcs]))
+			return self.arcs_hash
 		# Append arc to this candidate with its nodes and heuristics.
 		def update(self, parent, arc):
 			# Update path and path string.
 			self.path += [arc.from_node, arc]
 			self.arcs += [arc]
+			self.arcs_hash = None
 			self.path_strings += [arc.from_node.phoneme, arc.intermediate_phonemes]
 			# Update heuristics.
 			# Ignore start node and end node's counts. Those arcs would only count how many times a word starts with
@@ -122,14 +131,13 @@ class Lattice:
 			self.length -= 1
 			# Pop from path and path string.
 			self.arcs = self.arcs[:-1]
+			self.arcs_hash = None
 			self.path = self.path[:-2] # path and path_strings had [node, arc, node], three references to remove.
 			self.path_strings = self.path_strings[:-2]
 
 	# Initialize pronunciation lattice.
-	# Breadth-first search will print # candidate paths every ITERATIONS_PER_PRINT. 
-	# Breadth-first search will give up after QUIT_THRESHOLD recurrences.
-	# The default values are tuned to terminate the dataset's longest word, "supercalifragilisticexpialidocious,"
-	# after a couple of minutes.
+	# ITERATIONS_PER_PRINT is no longer used: the search no longer iterates path by path.
+	# The search gives up on words with more than QUIT_THRESHOLD shortest paths.
 	def __init__(self, letters, ITERATIONS_PER_PRINT=25000, QUIT_THRESHOLD=1000000):
 		self.letters = letters
 		self.ITERATIONS_PER_PRINT = ITERATIONS_PER_PRINT
@@ -144,6 +152,12 @@ class Lattice:
 		self.nodes[hash(('', '', len(letters)))] = self.END_NODE
 
 		self.unrepresented_bigrams = set()
+		# The index-agnostic part of every arc add_forced has made, keyed by (substring, representation, count). See template.
+		self.templates = {}
+		# Seconds spent per stage ('search', 'gap_patching', 'heuristics', 'fusion'), filled by find_all_paths and decide.
+		self.timings = {}
+		# Sizes from the search: 'paths', 'iterations' (suffixes enumerated by shortest_paths) and 'gap_patches'.
+		self.stats = {}
 	# String interpretation of pronunciation lattice (unlinked. use print() for all linked pronunciations.)
 	def __str__(self):
 		s = ''
@@ -163,72 +177,174 @@ class Lattice:
 		for node in self.nodes:
 			print('Node {} has {} arcs into it and {} arcs out of it.'.format(node.matched_letter + node.phoneme + str(node.index), len(node.from_arcs), len(node.to_arcs)))
 
+	# Every shortest path from the start node to the end node, in the order a breadth-first search would find them
+	# (each path's arcs taken in the order they were added to their nodes).
+	# Arcs always point to higher indices, so visiting nodes in index order suffices to find every node's
+	# distance from the start, and in reverse, its distance to the end. Only arcs on some shortest path are
+	# followed, and each node's shortest suffixes are enumerated once and shared by every path through it:
+	# words with repeated segments (i.e. "solsolsolsolsol") converge on the same nodes over and over, and
+	# used to have each of those suffixes searched anew.
+	# Returns the paths (as tuples of arcs) and the furthest index reached from the start, or SEARCHED_TOO_LONG
+	# in place of the paths if there are more than QUIT_THRESHOLD of them.
+	def shortest_paths(self):
+		from operator import attrgetter
+		nodes = sorted(self.nodes.values(), key=attrgetter('index'))
+		from_start = {self.START_NODE: 0}
+		for node in nodes:
+			if node not in from_start:
+				continue
+			for arc in node.to_arcs:
+				if from_start.get(arc.to_node, from_start[node] + 2) > from_start[node] + 1:
+					from_start[arc.to_node] = from_start[node] + 1
+		furthest = max(0, max(node.index for node in from_start))
+		if self.END_NODE not in from_start:
+			return [], furthest
+		shortest = from_start[self.END_NODE]
+
+		# Arcs out of each node on a shortest path that stay on one.
+		to_end = {self.END_NODE: 0}
+		on_path = {}
+		for node in reversed(nodes):
+			if node not in from_start:
+				continue
+			for arc in node.to_arcs:
+				if arc.to_node in to_end and to_end.get(node, to_end[arc.to_node] + 2) > to_end[arc.to_node] + 1:
+					to_end[node] = to_end[arc.to_node] + 1
+			if node in to_end and from_start[node] + to_end[node] == shortest:
+				on_path[node] = [arc for arc in node.to_arcs if arc.to_node in on_path and to_end[arc.to_node] + 1 == to_end[node]]
+
+		# Count them before building any.
+		counts = {self.END_NODE: 1}
+		for node in reversed(nodes):
+			if node in on_path and node is not self.END_NODE:
+				counts[node] = sum(counts[arc.to_node] for arc in on_path[node])
+		if counts[self.START_NODE] > self.QUIT_THRESHOLD:
+			return SEARCHED_TOO_LONG, furthest
+
+		suffixes = {self.END_NODE: [()]}
+		for node in reversed(nodes):
+			if node in on_path and node is not self.END_NODE:
+				suffixes[node] = [(arc,) + suffix for arc in on_path[node] for suffix in suffixes[arc.to_node]]
+				self.stats['iterations'] = self.stats.get('iterations', 0) + len(suffixes[node])
+		return suffixes[self.START_NODE], furthest
+
+	# Candidates for every shortest path (see shortest_paths), patching gaps until some path exists.
+	# The breadth-first search this replaced also returned longer paths it happened to reach. decide only ever
+	# ranks the shortest, so results are unchanged, but stats['paths'] now counts shortest paths alone.
 	def find_all_paths(self, verbose = False):
-		from collections import deque
 		import time
 		time_before = time.perf_counter()
-		
-		furthest_index = 0
-		overflow = False
-		
-		def bfs(start, end):
-			import sys
-			iter_count = 0
-			min_length = sys.maxsize
-			nonlocal overflow
-			nonlocal furthest_index
-
-			queue = deque([([start], [])])  # Each item in the queue is a tuple (nodes, arcs)
-			paths = []
-			while queue:
-				# Avoid searching for too long.
-				if iter_count != 0 and iter_count%self.ITERATIONS_PER_PRINT == 0:
-					print('Iterated {} times. {} paths found.'.format(iter_count, len(paths)))
-				iter_count += 1
-				if iter_count > self.QUIT_THRESHOLD:
-					overflow = True
-					return
-
-				nodes, arcs = queue.popleft()
-				node = nodes[-1]
-				furthest_index = node.index if node.index > furthest_index else furthest_index
-
-				if node == end:
-					min_length = len(arcs)
-					paths.append(arcs)
-				elif len(arcs) + 1 > min_length:
-					continue
-				for arc in node.to_arcs:
-					neighbor = arc.to_node
-					if neighbor not in nodes:
-						queue.append((nodes + [neighbor], arcs + [arc]))
-			return paths
 
+		def stop_timing():
+			self.timings['search'] = time.perf_counter() - time_before - self.timings['gap_patching']
+		self.timings['gap_patching'] = 0
+		self.stats['gap_patches'] = 0
+		furthest_index = 0
 		prev_furthest_index = -1
-		while (furthest_index < len(self.letters)):
-			paths = bfs(self.START_NODE, self.END_NODE)
+		while True:
+			paths, furthest = self.shortest_paths()
+			furthest_index = max(furthest_index, furthest)
 			# Various error handling:
-			if furthest_index == prev_furthest_index:
-				print('Progress has stopped.')
-				return NO_PATHS_FOUND
-			if overflow:
+			if paths == SEARCHED_TOO_LONG:
+				stop_timing()
 				return SEARCHED_TOO_LONG
 			if len(paths) > 0:
 				break
-			print('WARNING. No paths found. Attempting to patch gap at index {}:'.format(furthest_index))
+			if furthest_index == prev_furthest_index:
+				logger.debug('Progress has stopped.')
+				stop_timing()
+				return NO_PATHS_FOUND
+			logger.debug('No paths found. Attempting to patch gap at index %d:', furthest_index)
+			time_before_patch = time.perf_counter()
 			self.link_silences(furthest_index)
+			self.timings['gap_patching'] += time.perf_counter() - time_before_patch
+			self.stats['gap_patches'] += 1
 			prev_furthest_index = furthest_index
 
 		candidates = []
 		if verbose:
 			print('CANDIDATES FOUND:')
 		for path in paths:
-			candidates.append(self.Candidate(self, path))
+			candidates.append(self.Candidate(self, list(path)))
+			if verbose:
+				print("{}, length: {}".format(candidates[-1].pronunciation, len(candidates[-1].arcs)))
+
+		stop_timing()
+		self.stats['paths'] = len(candidates)
+		logger.debug('Found %d paths in %f seconds', len(candidates), time.perf_counter() - time_before)
+		return candidates
+
+	# An alternative to find_all_paths whose cost is bounded. Nodes are visited in index order, and each keeps only
+	# the beam_width best partial paths reaching it: the shortest, then those with the greatest arc count product
+	# (see compute_heuristics), scored incrementally as the sum of the arcs' log counts. The end node's beam becomes
+	# the candidates, shortest first, for decide to rank as it ranks find_all_paths' candidates. Work grows with the
+	# number of arcs times beam_width, so linearly with the word's length, where the exhaustive search can explode.
+	# Gaps are patched as in find_all_paths. beam_width must be at least 1.
+	def find_paths_by_beam(self, beam_width=16, verbose=False):
+		import heapq
+		import math
+		import time
+		from operator import attrgetter
+		if beam_width < 1:
+			raise ValueError('beam_width must be at least 1, not {}.'.format(beam_width))
+		time_before = time.perf_counter()
+		score = lambda partial: (partial[0], partial[1])
+
+		# Returns the partial paths reaching the end node, and the furthest index any partial path reached.
+		def search():
+			# Partial paths into each node not yet visited, as (length, negated log of arc count product, arcs).
+			beams = {self.START_NODE: [(0, 0.0, ())]}
+			furthest = 0
+			extensions = 0
+			for node in sorted(self.nodes.values(), key=attrgetter('index')):
+				beam = beams.pop(node, None)
+				if not beam:
+					continue
+				furthest = max(furthest, node.index)
+				beam = heapq.nsmallest(beam_width, beam, key=score)
+				if node is self.END_NODE:
+					self.stats['iterations'] = self.stats.get('iterations', 0) + extensions
+					return beam, furthest
+				for length, cost, arcs in beam:
+					for arc in node.to_arcs:
+						beams.setdefault(arc.to_node, []).append((length + 1, cost - math.log(arc.count), arcs + (arc,)))
+						extensions += 1
+			self.stats['iterations'] = self.stats.get('iterations', 0) + extensions
+			return [], furthest
+
+		def stop_timing():
+			self.timings['search'] = time.perf_counter() - time_before - self.timings['gap_patching']
+		self.timings['gap_patching'] = 0
+		self.stats['gap_patches'] = 0
+		furthest_index = 0
+		prev_furthest_index = -1
+		while True:
+			paths, furthest = search()
+			if len(paths) > 0:
+				break
+			furthest_index = max(furthest_index, furthest)
+			if furthest_index == prev_furthest_index:
+				logger.debug('Progress has stopped.')
+				stop_timing()
+				return NO_PATHS_FOUND
+			logger.debug('No paths found. Attempting to patch gap at index %d:', furthest_index)
+			time_before_patch = time.perf_counter()
+			self.link_silences(furthest_index)
+			self.timings['gap_patching'] += time.perf_counter() - time_before_patch
+			self.stats['gap_patches'] += 1
+			prev_furthest_index = furthest_index
+
+		candidates = []
+		if verbose:
+			print('CANDIDATES FOUND:')
+		for _, _, arcs in paths:
+			candidates.append(self.Candidate(self, list(arcs)))
 			if verbose:
 				print("{}, length: {}".format(candidates[-1].pronunciation, len(candidates[-1].arcs)))
 
-		duration = time.perf_counter() - time_before
-		print('Found {} paths in {} seconds'.format(len(candidates), duration))
+		stop_timing()
+		self.stats['paths'] = len(candidates)
+		logger.debug('Found %d paths by beam search in %f seconds', len(candidates), time.perf_counter() - time_before)
 		return candidates
 
 	# Count identical pronunciations generating
@@ -258,7 +374,13 @@ class Lattice:
 
 		pronunciation_to_repeat_count, pronunciation_to_sum_of_product = self.get_frequencies_by_pronunciation(candidates)
 
-		other_candidates_symbols = ''
+		# How many candidates have each symbol at each index. A candidate's symbol differs from every other
+		# candidate's at that index but those sharing it, so counting differences takes no pairwise comparisons.
+		symbol_counts = [{} for _ in candidates[0].pronunciation] if len(candidates) > 0 else []
+		for candidate in candidates:
+			for j, ch in enumerate(candidate.pronunciation):
+				symbol_counts[j][ch] = symbol_counts[j].get(ch, 0) + 1
+
 		for i in range(len(candidates)):
 			pronunciation = candidates[i].pronunciation
 			# 2. Minimum standard deviation.
@@ -271,15 +393,11 @@ class Lattice:
 			candidates[i].sum_of_products = pronunciation_to_sum_of_product[pronunciation]
 
 			# 4. Minimum number of different symbols per candidate.
-			number_of_different_symbols = 0
-			# Isolate current candidate from others.
-			other_candidates = candidates[:i] + candidates[i + 1:]
 			# Compare char at each index of this candidate to that of every competitor, counting differences.
-			for other_candidate in other_candidates:
-				for j, ch in enumerate(pronunciation):
-					number_of_different_symbols += 1 if ch != other_candidate.pronunciation[j] else 0
+			number_of_different_symbols = 0
+			for j, ch in enumerate(pronunciation):
+				number_of_different_symbols += len(candidates) - symbol_counts[j][ch]
 			candidates[i].number_of_different_symbols = number_of_different_symbols
-			#print('{} different symbols in {} versus {}'.format(number_of_different_symbols, candidates[i], other_candidates_symbols))
 
 			# 5. Maximum weakest link. (The weakest link is the minimum arc count)
 			candidates[i].weakest_link = min([arc.count for arc in candidates[i].arcs if not arc.contains([self.START_NODE, self.END_NODE])])
@@ -289,6 +407,7 @@ class Lattice:
 	# Ranks candidates by the five heuristics. 
 	def rank_by_heuristics(self, candidates):
 		import itertools
+		import time
 		# Rank according to these five heuristics and orders.
 		heuristic = ['arc_count_product', \
 			'path_structure_standard_deviation', \
@@ -303,6 +422,7 @@ class Lattice:
 		results = tuple([self.rank_to_score(leaderboard, heuristic[i]) for i, leaderboard in enumerate(results)])
 
 		labeled_results = {}
+		time_before = time.perf_counter()
 		# Rank fusion.
 		# There are 31 possible rank fusions, i.e.:
 		# 00001, 00011, 00101, ..., 10111, 01111, 11111
@@ -331,6 +451,7 @@ class Lattice:
 			#print(label)
 			#print('{}: {}'.format(best.pronunciation, best_val))
 			labeled_results[label] = best
+		self.timings['fusion'] = time.perf_counter() - time_before
 		return labeled_results
 
 	# The best rank is 1. Then 2, then 3, and so on.
@@ -411,6 +532,7 @@ class Lattice:
 	def decide(self, candidates, verbose=False):
 		from operator import attrgetter
 		from collections.abc import Iterable
+		import time
 		# I will explain this very clearly for my future self.
 		# PART 1:
 		# - func is a function, either min() or max().
@@ -440,13 +562,13 @@ class Lattice:
 					d=[choice.pronunciation for choice in filtered_list]))
 			return filtered_list
 		if candidates == None:
-			print('Candidates list is None.')
+			logger.debug('Candidates list is None.')
 			return
 		elif not isinstance(candidates, Iterable) and candidates in ERRORS:
-			print('Error reached.')
+			logger.debug('Error reached.')
 			return candidates # This is an error code.
 		elif len(candidates) == 0:
-			print('Candidates list is empty.')
+			logger.debug('Candidates list is empty.')
 			return
 
 		
@@ -460,6 +582,7 @@ class Lattice:
 			# Convert to strings.
 			return {'min_length': min_lengths[0]}
 
+		time_before = time.perf_counter()
 		self.compute_heuristics(min_lengths)
 		results = self.rank_by_heuristics(min_lengths)
 
@@ -468,68 +591,79 @@ class Lattice:
 		results['sum_of_products'] = func_by_attribute(min_lengths, 'sum_of_products', max)[0]
 		# Old selection method.
 		results['arc_count_sum'] = func_by_attribute(min_lengths, 'arc_count_sum', max)[0]
+		# rank_by_heuristics timed its own fusion.
+		self.timings['heuristics'] = time.perf_counter() - time_before - self.timings['fusion']
 
 		return results
-	# Given two lattices a and b,
-	# a_only is the set of arcs distinct to a
-	# b_only is the set of arcs distinct to b
-	# shared is the set of arcs in both a and b
+	# Given two lattices a and b, returns a dict of:
+	# unique_to_a, the list of arcs distinct to a
+	# unique_to_b, the list of arcs distinct to b
+	# shared, the list of (arc in a, arc in b) for arcs in both a and b
 	# given each shared arc s and its diff = (count of s in a) - (count of s in b)
 	#	a_shortage is the subset of shared arcs such that diff < 0
 	#	a_surplus is the subset of shared arcs such that diff > 0
 	#	a_b_unity is the subset of shared arcs such that diff = 0
+	# as well as their summed counts: unique_to_a_sum, unique_to_b_sum, a_shortage_sum, a_surplus_sum, and unity_sum.
 	@staticmethod
-	def print_lattice_comparison(a, b):
-		print('LATTICE COMPARISON:')
-		unique_to_a, unique_to_b, shared, a_shortage, a_surplus, a_b_unity = [], [], [], [], [], []
+	def compare_lattices(a, b):
+		comparison = {'unique_to_a': [], 'unique_to_b': [], 'shared': [], 'a_shortage': [], 'a_surplus': [], 'a_b_unity': [], \
+			'unique_to_a_sum': 0, 'unique_to_b_sum': 0, 'a_shortage_sum': 0, 'a_surplus_sum': 0, 'unity_sum': 0}
 		# Populate uniques and shared
-		unique_to_a_sum = 0
-		unique_to_b_sum = 0
 		for hash_ in a.arcs:
 			# Arcs not in b.
 			if hash_ not in b.arcs:
-				unique_to_a_sum += a.arcs[hash_].count
-				unique_to_a.append(a.arcs[hash_])
+				comparison['unique_to_a_sum'] += a.arcs[hash_].count
+				comparison['unique_to_a'].append(a.arcs[hash_])
 			# Shared arcs.
 			else:
 				# Shared will be further disambiguated later, so do not factor in its counts yet.
 				# Append a tuple of the reference in a and its reference in b.
-				shared.append((a.arcs[hash_], b.arcs[hash_]))
+				comparison['shared'].append((a.arcs[hash_], b.arcs[hash_]))
 		# Arcs not in a.
 		for hash_ in b.arcs:
 			if hash_ not in a.arcs:
-				unique_to_b_sum += b.arcs[hash_].count
-				unique_to_b.append(b.arcs[hash_])
-		# Sanity check.
-
-		if len(a.arcs) + len(b.arcs) - 2*len(shared) != len(unique_to_a) + len(unique_to_b):
-			print('Sanity check failed. {} + {} - 2*{} != {} + {}'.format(len(a.arcs), len(b.arcs), len(shared), len(unique_to_a), len(unique_to_b)))
-
-		print('{} arcs were shared, {} were unique to a, {} were unique to b.'.format(len(shared), len(unique_to_a), len(unique_to_b)))
-		a_shortage_sum = 0
-		a_surplus_sum = 0
-		unity_sum = 0
+				comparison['unique_to_b_sum'] += b.arcs[hash_].count
+				comparison['unique_to_b'].append(b.arcs[hash_])
 		# Split shared into a_shortage, a_surplus, and a_b_unity.
-		for arc_in_a, arc_in_b in shared:
+		for arc_in_a, arc_in_b in comparison['shared']:
 			diff = arc_in_a.count - arc_in_b.count
 			if diff < 0:
-				a_shortage_sum += diff
-				a_shortage.append((arc_in_a, arc_in_b))
+				comparison['a_shortage_sum'] += diff
+				comparison['a_shortage'].append((arc_in_a, arc_in_b))
 			elif diff > 0:
-				a_surplus_sum += diff
-				a_surplus.append((arc_in_a, arc_in_b))
+				comparison['a_surplus_sum'] += diff
+				comparison['a_surplus'].append((arc_in_a, arc_in_b))
 			else:
-				a_b_unity.append((arc_in_a, arc_in_b))
-				unity_sum += arc_in_a.count
+				comparison['a_b_unity'].append((arc_in_a, arc_in_b))
+				comparison['unity_sum'] += arc_in_a.count
+		return comparison
+
+	# True when a and b have the same arcs with the same counts.
+	@staticmethod
+	def lattices_equal(a, b):
+		comparison = Lattice.compare_lattices(a, b)
+		return not (comparison['unique_to_a'] or comparison['unique_to_b'] or comparison['a_shortage'] or comparison['a_surplus'])
+
+	@staticmethod
+	def print_lattice_comparison(a, b):
+		print('LATTICE COMPARISON:')
+		comparison = Lattice.compare_lattices(a, b)
+		unique_to_a, unique_to_b, shared = comparison['unique_to_a'], comparison['unique_to_b'], comparison['shared']
+		a_shortage, a_surplus, a_b_unity = comparison['a_shortage'], comparison['a_surplus'], comparison['a_b_unity']
+		# Sanity check.
+		if len(a.arcs) + len(b.arcs) - 2*len(shared) != len(unique_to_a) + len(unique_to_b):
+			print('Sanity check failed. {} + {} - 2*{} != {} + {}'.format(len(a.arcs), len(b.arcs), len(shared), len(unique_to_a), len(unique_to_b)))
+
+		print('{} arcs were shared, {} were unique to a, {} were unique to b.'.format(len(shared), len(unique_to_a), len(unique_to_b)))
 		# Sanity check.
 		if len(a_shortage) + len(a_surplus) + len(a_b_unity) != len(shared):
 			print('Sanity check #2 failed: {} + {} + {} != {}'.format(len(a_shortage), len(a_surplus), len(a_b_unity), len(shared)))
 		print('Of the {} shared arcs:\n  {} had fewer counts in a ({}),\n  {} had greater counts in a ({}), and\n  {} had the same counts in both ({})'.format( \
-			len(shared), len(a_shortage), a_shortage_sum, len(a_surplus), a_surplus_sum, len(a_b_unity), unity_sum))
+			len(shared), len(a_shortage), comparison['a_shortage_sum'], len(a_surplus), comparison['a_surplus_sum'], len(a_b_unity), comparison['unity_sum']))
 
 		print('COUNT OFFSET:')
 		print('unique_to_a_sum: {}, unique_to_b_sum: {}, a_shortage_sum: {}, a_surplus_sum: {}, unity_sum: {}'.format( \
-			unique_to_a_sum, unique_to_b_sum, a_shortage_sum, a_surplus_sum, unity_sum))
+			comparison['unique_to_a_sum'], comparison['unique_to_b_sum'], comparison['a_shortage_sum'], comparison['a_surplus_sum'], comparison['unity_sum']))
 
 		out = ''
 		out += 'Arcs with greater counts in A:\n'
@@ -549,8 +683,6 @@ class Lattice:
 
 	def create_or_iterate_arc(self, inter, inter_letters, a, b, word='', forced_count=0):
 		#print('Given word "{}":'.format(word))
-		new = self.Arc(inter, inter_letters, a, b)
-		#print('  Looking for arc {} in:\n'.format(new))
 		found = self.arcs.get(hash((inter, a, b)), None)
 		if found is not None: 
 			if forced_count != 0:
@@ -560,8 +692,8 @@ class Lattice:
 			found.count += 1 if not found.contains([self.START_NODE, self.END_NODE]) else 0 # this word's first and end letter.
 			found.from_words.append(word)
 			return found
+		new = self.Arc(inter, inter_letters, a, b)
 		self.arcs[hash((inter, a, b))] = new # Not found. Add new one.
-		found2 = self.arcs.get(hash((inter, a, b)), None)
 		a.to_arcs.append(new)
 		b.from_arcs.append(new)
 		new.from_words.append(word)
@@ -571,21 +703,35 @@ class Lattice:
 		return new				# Return.
 		
 	def create_or_find_node(self, l, p, i):
-		new = self.Node(l, p, i)
 		found = self.nodes.get(hash((l, p, i)), None)
 		if found is not None:
 			return found # Found. Return.
 
+		new = self.Node(l, p, i)
 		self.nodes[hash((l, p, i))] = new # Not found. Add new one.
 		return new 	# Return it.
 
+	# An arc's endpoints' letters and phonemes, what lies between them, and how far apart they are: everything
+	# about it but where it starts. Repeated segments of a word (the "sol"s of "solsolsolsolsol", or the "ar"s
+	# of "tartar") match the same substrings at several offsets, often with the same counts, and every offset
+	# now shares one template (and its strings) rather than slicing its own.
+	def template(self, sub_letters, sub_phones, count):
+		key = (sub_letters, sub_phones, count)
+		found = self.templates.get(key, None)
+		if found is None:
+			found = (sub_letters[0], sub_phones[0], sub_letters[-1], sub_phones[-1], sub_phones[1:-1], sub_letters[1:-1], len(sub_letters) - 1)
+			self.templates[key] = found
+		return found
+
 	# Adds phonemes with a precalculated count. Yeah, I could overload add, but multiprocessing 
 	# passes in a tuple of arguments with no regard for default arguments' names, and I don't want
 	# that to cause issues (like "word" being mistaken for "forced_count" or vice versa).
 	def add_forced(self, sub_letters, sub_phones, start_index, forced_count):
-		a = self.create_or_find_node(sub_letters[0], sub_phones[0], start_index)
-		b = self.create_or_find_node(sub_letters[-1], sub_phones[-1], start_index + len(sub_letters) - 1)
-		arc = self.create_or_iterate_arc(sub_phones[1:-1], sub_letters[1:-1], a, b, forced_count=forced_count)
+		first_letter, first_phone, last_letter, last_phone, inter_phones, inter_letters, span = \
+			self.template(sub_letters, sub_phones, forced_count)
+		a = self.create_or_find_node(first_letter, first_phone, start_index)
+		b = self.create_or_find_node(last_letter, last_phone, start_index + span)
+		arc = self.create_or_iterate_arc(inter_phones, inter_letters, a, b, forced_count=forced_count)
 		if start_index == 0:
 			start_arc = self.create_or_iterate_arc('', '', self.START_NODE, a)
 		if start_index + len(sub_letters) == len(self.letters):
@@ -620,7 +766,7 @@ class Lattice:
 			if len(nodes_beyond) == 0:
 				# TODO: Get this to work with Syllabification (which does not expect '-')
 				nodes_beyond.append(self.Node(self.letters[i + 1], '-', i + 1))
-			print('Adding {} x {} arcs'.format(len(furthest_reached_nodes), len(nodes_beyond)))
+			logger.debug('Adding %d x %d arcs', len(furthest_reached_nodes), len(nodes_beyond))
 			for from_node in furthest_reached_nodes:
 				for to_node in nodes_beyond:
 					self.add(from_node.matched_letter + to_node.matched_letter, \
@@ -631,7 +777,7 @@ class Lattice:
 		# Find every instance of the problematic letters.
 		indices = [m.start() for m in re.finditer('(?={})'.format(silent_pair), self.letters)]
 		# Patch all instances.
-		print('Instances of {}:\n{}'.format(silent_pair, indices))
+		logger.debug('Instances of %s:\n%s', silent_pair, indices)
 		for index in indices:
 			link(index)
-		print('Successfully added {} arcs.'.format(added_count))
+		logger.debug('Successfully added %d arcs.', added_count)
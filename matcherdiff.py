@@ -0,0 +1,196 @@
+# Differential equivalence and speed checks across the pattern matchers.
+# Each sampled word's lattice is built by every matcher and compared arc by arc against the lattice
+# built by that matcher's reference (the implementation it is supposed to reproduce). Every
+# (word, matcher) pair becomes one JSON record holding the arc-set differences, count deltas,
+# per-stage timings, and whether the decided pronunciations agree.
+
+# Compare against an earlier run's records (--baseline) to flag regressions in either equivalence or speed:
+#   python matcherdiff.py output --skip-every 20 --sample 50 --out Data/matcherdiff.jsonl
+#   python matcherdiff.py output --skip-every 20 --sample 50 --baseline Data/matcherdiff.jsonl
+
+# complete: OldPatternMatcher.populate_precalculated_legacy ("complete matching")
+# optimized: PatternMatcher.populate_optimized
+# partial: OldPatternMatcher.populate_legacy ("partial matching")
+# vectorized: VectorizedMatcher.populate
+MATCHERS = ['complete', 'optimized', 'partial', 'vectorized']
+REFERENCES = {'optimized': 'complete', 'vectorized': 'partial'}
+# Matchers whose lattices must equal their reference's exactly. The optimized matcher is known
+# to differ from complete matching in a few edge cases (see patternmatcher.py), so it is only
+# flagged when it differs more than it did in the baseline.
+EXACT = ['vectorized']
+
+# Populates a lattice for input_word with the named matcher.
+# Returns the lattice, the number of matches added, and the time taken.
+def build(pba, matcher, input_word, pad=True):
+	import time
+	from lattice import Lattice
+	from pba import PronouncerByAnalogy
+	ldb = pba.lexical_database_pad if pad else pba.lexical_database
+	sdb = pba.substring_database_pad if pad else pba.substring_database
+	if matcher == 'complete':
+		args = (sdb, None, None, pba.bigram_index(pad), None)
+	elif matcher == 'optimized':
+		args = (sdb, pba.pm_pad if pad else pba.pm, None, None, None)
+	elif matcher == 'partial':
+		args = (None, None, None, pba.bigram_index(pad), None)
+	elif matcher == 'vectorized':
+		args = (None, None, None, None, pba.vectorized_matcher(pad))
+	else:
+		raise ValueError('Unknown matcher {}.'.format(matcher))
+	input_word = PronouncerByAnalogy.pad_if(input_word, pad)
+	pl = Lattice(input_word)
+	time_before = time.perf_counter()
+	match_count = PronouncerByAnalogy.populate(pl, input_word, ldb, *args)
+	return pl, match_count, time.perf_counter() - time_before
+
+# Returns the JSON-friendly part of Lattice.compare_lattices(a, b).
+def diff(a, b):
+	from lattice import Lattice
+	comparison = Lattice.compare_lattices(a, b)
+	return {
+		'unique_to_matcher': [str(arc) for arc in comparison['unique_to_a']],
+		'unique_to_reference': [str(arc) for arc in comparison['unique_to_b']],
+		# Shared arcs whose counts differ, with (matcher count - reference count).
+		'count_deltas': [[str(arc_in_a), arc_in_a.count - arc_in_b.count] \
+			for arc_in_a, arc_in_b in comparison['a_surplus'] + comparison['a_shortage']],
+		'unique_to_matcher_sum': comparison['unique_to_a_sum'],
+		'unique_to_reference_sum': comparison['unique_to_b_sum'],
+		'surplus_sum': comparison['a_surplus_sum'],
+		'shortage_sum': comparison['a_shortage_sum'],
+	}
+
+# The number of arcs on which a record's lattice disagrees with its reference's.
+def diff_size(record):
+	d = record.get('diff')
+	if d is None:
+		return 0
+	return len(d['unique_to_matcher']) + len(d['unique_to_reference']) + len(d['count_deltas'])
+
+# Builds, searches, and decides input_word's lattice with every matcher, returning one record each.
+def run_word(pba, input_word, matchers=MATCHERS, pad=True):
+	import time
+	from collections.abc import Iterable
+	from lattice import ERRORS
+	lattices = {}
+	records = {}
+	for matcher in matchers:
+		pl, match_count, duration = build(pba, matcher, input_word, pad)
+		lattices[matcher] = pl
+		records[matcher] = {'word': input_word, 'matcher': matcher, 'reference': REFERENCES.get(matcher), \
+			'matches': match_count, 'arcs': len(pl.arcs), 'nodes': len(pl.nodes), 'timings': {'populate': duration}}
+	# Compare before searching: gap patching during the search adds arcs of its own.
+	for matcher, record in records.items():
+		reference = record['reference']
+		if reference in lattices:
+			record['diff'] = diff(lattices[matcher], lattices[reference])
+			record['equivalent'] = diff_size(record) == 0
+	for matcher, record in records.items():
+		pl = lattices[matcher]
+		time_before = time.perf_counter()
+		candidates = pl.find_all_paths()
+		time_after_search = time.perf_counter()
+		results = pl.decide(candidates)
+		time_after_decision = time.perf_counter()
+		record['timings']['search'] = time_after_search - time_before
+		record['timings']['decide'] = time_after_decision - time_after_search
+		record['timings']['total'] = sum(record['timings'].values())
+		record['paths'] = len(candidates) if isinstance(candidates, Iterable) else 0
+		if isinstance(results, Iterable):
+			record['results'] = {key: results[key].pronunciation for key in results}
+		else:
+			record['results'] = ERRORS.get(results, str(results))
+	for matcher, record in records.items():
+		reference = record['reference']
+		if reference in records:
+			record['same_results'] = record['results'] == records[reference]['results']
+			record['speedup'] = records[reference]['timings']['populate']/max(record['timings']['populate'], 1e-9)
+	return [records[matcher] for matcher in matchers]
+
+# A reproducible sample of unpadded words from the lexicon.
+def sample(pba, size, seed=0):
+	import random
+	words = list(pba.lexical_database)
+	return random.Random(seed).sample(words, min(size, len(words)))
+
+# Returns a list of regression descriptions.
+# Exact matchers regress whenever their lattice differs from their reference's. Other matchers regress
+# when they differ on more arcs than in the baseline. Any matcher regresses when its total time exceeds
+# the baseline's by a factor of slowdown (and by at least min_seconds, to ignore timer noise).
+def check(records, baseline=None, slowdown=1.5, min_seconds=0.05):
+	previous = {(record['word'], record['matcher']): record for record in (baseline or [])}
+	regressions = []
+	for record in records:
+		key = (record['word'], record['matcher'])
+		old = previous.get(key)
+		if 'diff' in record:
+			if record['matcher'] in EXACT and not record['equivalent']:
+				regressions.append('{} differs from {} on {} arcs for {}.'.format(record['matcher'], record['reference'], diff_size(record), record['word']))
+			elif old is not None and diff_size(record) > diff_size(old):
+				regressions.append('{} now differs from {} on {} arcs (previously {}) for {}.'.format( \
+					record['matcher'], record['reference'], diff_size(record), diff_size(old), record['word']))
+		if old is not None:
+			now, then = record['timings']['total'], old['timings']['total']
+			if now > then*slowdown and now - then > min_seconds:
+				regressions.append('{} took {:.4f} seconds for {} (previously {:.4f}).'.format(record['matcher'], now, record['word'], then))
+	return regressions
+
+# Per-matcher totals.
+def summarize(records):
+	import statistics
+	summary = {}
+	for record in records:
+		s = summary.setdefault(record['matcher'], {'words': 0, 'populate': 0, 'search': 0, 'decide': 0, 'total': 0, \
+			'lattices_differing': 0, 'results_differing': 0, 'speedups': []})
+		s['words'] += 1
+		for stage in ['populate', 'search', 'decide', 'total']:
+			s[stage] += record['timings'][stage]
+		if 'diff' in record:
+			s['lattices_differing'] += 0 if record['equivalent'] else 1
+			s['results_differing'] += 0 if record['same_results'] else 1
+			s['speedups'].append(record['speedup'])
+	for s in summary.values():
+		speedups = s.pop('speedups')
+		s['median_speedup'] = statistics.median(speedups) if speedups else None
+		s['words_per_second'] = s['words']/s['total'] if s['total'] else None
+	return summary
+
+def read_records(path):
+	import json
+	with open(path, 'r', encoding='latin-1') as f:
+		return [json.loads(line) for line in f if line.strip()]
+
+def main(argv=None):
+	import argparse
+	import json
+	from pba import PronouncerByAnalogy
+	parser = argparse.ArgumentParser(description='Compare lattices and timings across pattern matchers.')
+	parser.add_argument('dataset', help='Dataset name within Preprocessing/Out/, without ".txt".')
+	parser.add_argument('--folder', default='Data/', help='Where loaded and optimized artifacts are cached.')
+	parser.add_argument('--skip-every', type=int, default=-1)
+	parser.add_argument('--offset', type=int, default=0)
+	parser.add_argument('--sample', type=int, default=25, help='Number of lexicon words to sample.')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--words', nargs='*', default=[], help='Extra words to compare.')
+	parser.add_argument('--matchers', nargs='*', default=MATCHERS, choices=MATCHERS)
+	parser.add_argument('--no-pad', action='store_true')
+	parser.add_argument('--out', help='Write one JSON record per (word, matcher) here.')
+	parser.add_argument('--baseline', help='Records from an earlier run to check for regressions.')
+	parser.add_argument('--slowdown', type=float, default=1.5)
+	args = parser.parse_args(argv)
+
+	pba = PronouncerByAnalogy(args.folder, args.dataset, skip_every=args.skip_every, offset=args.offset)
+	words = sample(pba, args.sample, args.seed) + args.words
+	records = []
+	for word in words:
+		records += run_word(pba, word, args.matchers, pad=not args.no_pad)
+	if args.out:
+		with open(args.out, 'w', encoding='latin-1') as f:
+			for record in records:
+				f.write(json.dumps(record) + '\n')
+	regressions = check(records, read_records(args.baseline) if args.baseline else None, args.slowdown)
+	print(json.dumps({'summary': summarize(records), 'regressions': regressions}, indent='\t'))
+	return 1 if regressions else 0
+
+if __name__ == "__main__":
+	import sys
+	sys.exit(main())
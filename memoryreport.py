@@ -0,0 +1,224 @@
+# Reports how much memory PbA's loaded structures take, for sizing worker processes and choosing what to compact.
+# Structures are walked object by object (see deep_size), and each object is counted once, toward the first
+# component that reaches it: a SubstringView, for instance, costs only itself, since the lexical database it
+# slices was counted already. For the PatternMatcher dicts, bytes are also broken down by substring length and
+# by fan-out (the number of representations a substring maps to), along with the heaviest substrings.
+# Lattices are measured for sample words, as built by pronounce.
+#   python memoryreport.py output --skip-every 20
+#   python memoryreport.py output --components pm_pad answer_table --words testing solsolsolsolsol --top 10 --json
+# With --tracemalloc, each component is also loaded afresh under tracemalloc, reporting the bytes
+# its loading left allocated: a cross-check on the walk, which can't see allocator overhead.
+
+# Components in the order they are walked, each mapped to how it is fetched from a PronouncerByAnalogy.
+COMPONENTS = {
+	'lexical_database': lambda pba: pba.artifact('lexical_database'),
+	'lexical_database_pad': lambda pba: pba.artifact('lexical_database_pad'),
+	'substring_database': lambda pba: pba.artifact('substring_database'),
+	'substring_database_pad': lambda pba: pba.artifact('substring_database_pad'),
+	'pm': lambda pba: pba.artifact('pm'),
+	'pm_pad': lambda pba: pba.artifact('pm_pad'),
+	'answer_table': lambda pba: pba.artifact('answer_table'),
+	'bigram_index_pad': lambda pba: pba.bigram_index(True),
+	'vectorized_matcher_pad': lambda pba: pba.vectorized_matcher(True),
+}
+DEFAULT_COMPONENTS = ['lexical_database', 'lexical_database_pad', 'substring_database', 'substring_database_pad', \
+	'pm', 'pm_pad', 'answer_table']
+
+# Bytes taken by obj and everything it references that isn't in seen (a set of ids, updated as objects are counted).
+# Classes, modules and functions are not counted, and memory-mapped files count only their mapping object.
+def deep_size(obj, seen=None):
+	import sys
+	import types
+	if seen is None:
+		seen = set()
+	size = 0
+	stack = [obj]
+	while stack:
+		o = stack.pop()
+		if id(o) in seen or isinstance(o, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+			continue
+		seen.add(id(o))
+		size += sys.getsizeof(o)
+		if isinstance(o, (str, bytes, bytearray, int, float, bool)) or o is None:
+			continue
+		if isinstance(o, dict):
+			stack.extend(o.keys())
+			stack.extend(o.values())
+		elif isinstance(o, (list, tuple, set, frozenset)):
+			stack.extend(o)
+		elif type(o).__module__ == 'numpy':
+			# A view's buffer belongs to its base.
+			if getattr(o, 'base', None) is not None:
+				stack.append(o.base)
+		else:
+			if hasattr(o, '__dict__'):
+				stack.append(vars(o))
+			for slot in getattr(type(o), '__slots__', ()):
+				if hasattr(o, slot):
+					stack.append(getattr(o, slot))
+	return size
+
+# The number of entries in a component, where that means anything.
+def entries(component):
+	from patternmatcher import PatternMatcher
+	if isinstance(component, PatternMatcher):
+		return len(component.substring_to_alt_domain_count_dict)
+	# Indices over a lexicon.
+	if isinstance(getattr(component, 'entries', None), list):
+		return len(component.entries)
+	try:
+		return len(component)
+	except TypeError:
+		return None
+
+# Power-of-two buckets: 1, 2, 3-4, 5-8, 9-16, ...
+def bucket(n):
+	if n <= 2:
+		return str(n)
+	upper = 4
+	while upper < n:
+		upper *= 2
+	return '{}-{}'.format(upper//2 + 1, upper)
+
+# Bytes per substring of a PatternMatcher: the key, its dict of representations, and their counts.
+# Representation strings shared between substrings are counted toward each of them.
+def substring_sizes(pm):
+	import sys
+	for substring, representations in pm.substring_to_alt_domain_count_dict.items():
+		size = sys.getsizeof(substring) + sys.getsizeof(representations)
+		for representation, count in representations.items():
+			size += sys.getsizeof(representation) + sys.getsizeof(count)
+		yield substring, len(representations), size
+
+# Breaks a PatternMatcher's bytes down by substring length and by fan-out, and finds its top heaviest substrings.
+def break_down(pm, top=20):
+	import heapq
+	lengths = {}
+	fan_outs = {}
+	heaviest = []
+	for substring, fan_out, size in substring_sizes(pm):
+		for totals, key in ((lengths, len(substring.strip('#'))), (fan_outs, bucket(fan_out))):
+			total = totals.setdefault(key, {'keys': 0, 'bytes': 0})
+			total['keys'] += 1
+			total['bytes'] += size
+		if len(heaviest) < top:
+			heapq.heappush(heaviest, (size, substring, fan_out))
+		elif size > heaviest[0][0]:
+			heapq.heapreplace(heaviest, (size, substring, fan_out))
+	by_fan_out = {}
+	for key in sorted(fan_outs, key=lambda key: int(key.split('-')[0])):
+		by_fan_out[key] = fan_outs[key]
+	return {'by_length': {length: lengths[length] for length in sorted(lengths)}, 'by_fan_out': by_fan_out, \
+		'heaviest': [{'substring': substring, 'fan_out': fan_out, 'bytes': size} for size, substring, fan_out in sorted(heaviest, reverse=True)]}
+
+# The size of each word's lattice once pronounce has populated and searched it.
+def lattice_sizes(pba, words, pad=True):
+	from pba import PronouncerByAnalogy
+	sizes = {}
+	ldb = pba.lexical_database_pad if pad else pba.lexical_database
+	pm = pba.pm_pad if pad else pba.pm
+	for word in words:
+		_, _, pl = PronouncerByAnalogy.pronounce(PronouncerByAnalogy.pad_if(word, pad), ldb, None, pm, test_mode=True)
+		sizes[word] = {'nodes': len(pl.nodes), 'arcs': len(pl.arcs), 'bytes': deep_size(pl)}
+	return sizes
+
+# Loads each component into a fresh PronouncerByAnalogy under tracemalloc. Returns the bytes each left allocated.
+def traced(folder, dataset, skip_every, offset, names):
+	import tracemalloc
+	from pba import PronouncerByAnalogy
+	pba = PronouncerByAnalogy(folder, dataset, skip_every, offset)
+	allocated = {}
+	tracemalloc.start()
+	try:
+		for name in names:
+			before = tracemalloc.get_traced_memory()[0]
+			COMPONENTS[name](pba)
+			allocated[name] = tracemalloc.get_traced_memory()[0] - before
+	finally:
+		tracemalloc.stop()
+	return allocated
+
+# Returns the whole report as a JSON-friendly dict.
+def report(pba, names=None, words=(), top=20):
+	import os
+	from patternmatcher import PatternMatcher
+	from answertable import AnswerTable
+	if names is None:
+		names = DEFAULT_COMPONENTS
+	seen = set()
+	components = {}
+	breakdowns = {}
+	for name in [name for name in COMPONENTS if name in names]:
+		component = COMPONENTS[name](pba)
+		components[name] = {'bytes': deep_size(component, seen), 'entries': entries(component)}
+		if isinstance(component, AnswerTable):
+			# Mapped from disk, and shared between processes.
+			components[name]['mapped_bytes'] = os.path.getsize(component.path)
+		if isinstance(component, PatternMatcher):
+			breakdowns[name] = break_down(component, top)
+	result = {'components': components, 'total_bytes': sum(component['bytes'] for component in components.values()), \
+		'pattern_matchers': breakdowns}
+	if words:
+		result['lattices'] = lattice_sizes(pba, words)
+	return result
+
+def megabytes(n):
+	return '{:.2f} MB'.format(n/2**20)
+
+def print_report(result):
+	print('COMPONENTS:')
+	for name, component in result['components'].items():
+		mapped = ' (+{} mapped)'.format(megabytes(component['mapped_bytes'])) if 'mapped_bytes' in component else ''
+		traced = ', {} traced'.format(megabytes(component['traced_bytes'])) if 'traced_bytes' in component else ''
+		print('  {:<24}{:>12}{}{}, {} entries'.format(name, megabytes(component['bytes']), mapped, traced, component['entries']))
+	print('  {:<24}{:>12}'.format('total', megabytes(result['total_bytes'])))
+	for name, breakdown in result['pattern_matchers'].items():
+		print('\n{} BY SUBSTRING LENGTH:'.format(name))
+		for length, total in breakdown['by_length'].items():
+			print('  {:>5}: {:>8} substrings, {:>12}'.format(length, total['keys'], megabytes(total['bytes'])))
+		print('{} BY FAN-OUT:'.format(name))
+		for fan_out, total in breakdown['by_fan_out'].items():
+			print('  {:>9}: {:>8} substrings, {:>12}'.format(fan_out, total['keys'], megabytes(total['bytes'])))
+		print('{} HEAVIEST SUBSTRINGS:'.format(name))
+		for heavy in breakdown['heaviest']:
+			print('  {}: {} representations, {} bytes'.format(heavy['substring'], heavy['fan_out'], heavy['bytes']))
+	if 'lattices' in result:
+		print('\nLATTICES:')
+		for word, lattice in result['lattices'].items():
+			print('  {}: {} nodes, {} arcs, {} bytes'.format(word, lattice['nodes'], lattice['arcs'], lattice['bytes']))
+
+def main(argv=None):
+	import argparse
+	import contextlib
+	import json
+	import sys
+	from pba import PronouncerByAnalogy
+	parser = argparse.ArgumentParser(description='Report the memory taken by PbA\'s loaded structures.')
+	parser.add_argument('dataset', help='Dataset name within Preprocessing/Out/, without ".txt".')
+	parser.add_argument('--folder', default='Data/', help='Where loaded and optimized artifacts are cached.')
+	parser.add_argument('--skip-every', type=int, default=-1)
+	parser.add_argument('--offset', type=int, default=0)
+	parser.add_argument('--components', nargs='+', choices=list(COMPONENTS), default=DEFAULT_COMPONENTS)
+	parser.add_argument('--words', nargs='*', default=['testing', 'authentication', 'solsolsolsolsol'], help='Words whose lattices to measure.')
+	parser.add_argument('--top', type=int, default=20, help='How many of the heaviest substrings to list.')
+	parser.add_argument('--tracemalloc', action='store_true', help='Also measure each component\'s loading with tracemalloc.')
+	parser.add_argument('--json', action='store_true', help='Write the report to stdout as JSON.')
+	args = parser.parse_args(argv)
+
+	out = sys.stdout
+	with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+		pba = PronouncerByAnalogy(args.folder, args.dataset, args.skip_every, args.offset)
+		result = report(pba, args.components, args.words, args.top)
+		if args.tracemalloc:
+			for name, allocated in traced(args.folder, args.dataset, args.skip_every, args.offset, result['components']).items():
+				result['components'][name]['traced_bytes'] = allocated
+	if args.json:
+		json.dump(result, out, indent=1)
+		print(file=out)
+	else:
+		print_report(result)
+	return 0
+
+if __name__ == "__main__":
+	import sys
+	sys.exit(main())
@@ -0,0 +1,74 @@
+# Collects per-word stage timings and lattice sizes, and summarizes them as percentiles.
+# A Metrics is a callable hook taking one event per word, as made by Pronunciation.event():
+#   {'word': 'testing', 'timings': {'populate': 0.0012, 'search': 0.0004, ...}, 'sizes': {'nodes': 40, ...}, 'error': None}
+# so it can be installed on a pronouncer, or fed results that were decoded in other processes:
+#   pba.metrics = Metrics()
+#   for result in pba.pronounce_batch(words, parallel=True):
+#       ...
+#   pba.metrics.print_summary()
+# Stages and sizes are whatever the events carry (see PronouncerByAnalogy.pronounce). A stage a word never
+# reached (i.e. gap patching, or everything after a timeout) is left out of that stage's percentiles.
+
+class Metrics:
+	# The order stages are reported in. Others follow, alphabetically.
+	STAGES = ['lookup', 'populate', 'search', 'gap_patching', 'heuristics', 'fusion', 'decide', 'total']
+	SIZES = ['matches', 'nodes', 'arcs', 'paths', 'iterations', 'gap_patches']
+
+	def __init__(self, percentiles=(50, 90, 99)):
+		self.percentiles = percentiles
+		self.timings = {}
+		self.sizes = {}
+		self.words = 0
+		self.errors = {}
+
+	def __call__(self, event):
+		self.record(event)
+
+	def record(self, event):
+		self.words += 1
+		for stage, seconds in event.get('timings', {}).items():
+			self.timings.setdefault(stage, []).append(seconds)
+		for size, value in event.get('sizes', {}).items():
+			self.sizes.setdefault(size, []).append(value)
+		if event.get('error') is not None:
+			self.errors[event['error']] = self.errors.get(event['error'], 0) + 1
+
+	# Nearest-rank percentile of a sorted list.
+	@staticmethod
+	def percentile(ordered, p):
+		import math
+		if not ordered:
+			return None
+		return ordered[max(math.ceil(p/100*len(ordered)) - 1, 0)]
+
+	@staticmethod
+	def ordered(keys, order):
+		return [key for key in order if key in keys] + sorted(key for key in keys if key not in order)
+
+	def describe(self, values):
+		ordered = sorted(values)
+		summary = {'count': len(ordered), 'mean': sum(ordered)/len(ordered)}
+		for p in self.percentiles:
+			summary['p{}'.format(p)] = Metrics.percentile(ordered, p)
+		summary['max'] = ordered[-1]
+		return summary
+
+	# A JSON-friendly dict of every stage's and size's count, mean, percentiles and max.
+	def summary(self):
+		return {'words': self.words, 'errors': dict(self.errors), \
+			'timings': {stage: self.describe(self.timings[stage]) for stage in Metrics.ordered(self.timings, Metrics.STAGES)}, \
+			'sizes': {size: self.describe(self.sizes[size]) for size in Metrics.ordered(self.sizes, Metrics.SIZES)}}
+
+	# Stage timings in milliseconds, then sizes.
+	def print_summary(self, file=None):
+		summary = self.summary()
+		columns = ['count', 'mean'] + ['p{}'.format(p) for p in self.percentiles] + ['max']
+		print('{} words, {} errors.'.format(summary['words'], sum(summary['errors'].values())), file=file)
+		for error, count in summary['errors'].items():
+			print('  {}: {}'.format(error, count), file=file)
+		print('{:<14}'.format('stage (ms)') + ''.join('{:>10}'.format(column) for column in columns), file=file)
+		for stage, described in summary['timings'].items():
+			print('{:<14}{:>10}'.format(stage, described['count']) + ''.join('{:>10.3f}'.format(1000*described[column]) for column in columns[1:]), file=file)
+		print('{:<14}'.format('size') + ''.join('{:>10}'.format(column) for column in columns), file=file)
+		for size, described in summary['sizes'].items():
+			print('{:<14}{:>10}'.format(size, described['count']) + ''.join('{:>10.1f}'.format(described[column]) for column in columns[1:]), file=file)
@@ -21,37 +21,171 @@ class OldPatternMatcher:
 		return OldPatternMatcher.populate_precalculated_legacy(input_word, entry_word, phonemes, entry_substrings)
 
 
-	@staticmethod
-	def manage_batch_populate(pl, input_word, lexical_database, substring_database, verbose=False):
-		import multiprocessing as mp
-		import math
-		# Chunking dicts courtesy https://stackoverflow.com/a/66555740/12572922
-		def chunks(data, data2=None, SIZE=10000):
+	# A long-lived set of worker processes, each holding one contiguous shard of the lexical database
+	# (and, for complete matching, a SubstringView over it). Shards are handed over once at startup,
+	# so each word only ships the input word out and the match tuples back.
+	# Use as a context manager, or call close() when done:
+	#   with OldPatternMatcher.MatcherPool(lexical_database, substring_database) as pool:
+	#       matches = pool.populate('#testing#')
+	class MatcherPool:
+		def __init__(self, lexical_database, substring_database=None, processes=None):
+			import multiprocessing as mp
+			import math
 			from itertools import islice
-			it1 = iter(data)
-			if data2==None:
-				for i in range(0, len(data), SIZE):
-					yield {k:data[k] for k in islice(it1, SIZE)}
-				return
-
-			it2 = iter(data2)
-			for i in range(0, len(data), SIZE):
-				yield {k:data[k] for k in islice(it1, SIZE)}, {k:data2[k] for k in islice(it2, SIZE)}
-		# Spawns multiple processes for matching patterns within the lexical database.
-		num_processes = mp.cpu_count()
-		pool = mp.Pool(processes=num_processes)
-		if substring_database is None:
-			processes = [pool.apply_async(OldPatternMatcher.populate_batch, args=( \
-				input_word, lexical_subset)) \
-				for lexical_subset in chunks(lexical_database, SIZE=math.ceil(len(lexical_database)/num_processes)) ]
-		# Better method (unfortunately does not benefit from multiprocessing.)
-		else:
-			processes = [pool.apply_async(OldPatternMatcher.populate_batch, args=( \
-				input_word, lexical_subset, substring_subset)) \
-				for lexical_subset, substring_subset in chunks(lexical_database, substring_database, SIZE=math.ceil(len(lexical_database)/num_processes)) ]
+			from substringview import SubstringView
+			if processes is None:
+				processes = mp.cpu_count()
+			size = max(1, math.ceil(len(lexical_database)/processes))
+			self.workers = []
+			self.tasks = []
+			self.results = []
+			self.sequence = 0
+			it = iter(lexical_database)
+			for i in range(0, len(lexical_database), size):
+				lexical_shard = {k:lexical_database[k] for k in islice(it, size)}
+				substring_shard = None
+				if substring_database is not None:
+					substring_shard = SubstringView(lexical_shard)
+				tasks = mp.Queue()
+				results = mp.Queue()
+				worker = mp.Process(target=OldPatternMatcher.MatcherPool.serve, \
+					args=(lexical_shard, substring_shard, tasks, results), daemon=True)
+				worker.start()
+				self.workers.append(worker)
+				self.tasks.append(tasks)
+				self.results.append(results)
+
+		# Runs in each worker until it receives None. Replies carry their task's sequence number, and either
+		# the matches or the exception raised finding them.
+		@staticmethod
+		def serve(lexical_shard, substring_shard, tasks, results):
+			import pickle
+			index = OldPatternMatcher.BigramIndex(lexical_shard)
+			while True:
+				task = tasks.get()
+				if task is None:
+					return
+				sequence, input_word, exclude = task
+				try:
+					results.put((sequence, OldPatternMatcher.populate_batch(input_word, lexical_shard, substring_shard, exclude, index), None))
+				except Exception as e:
+					try:
+						pickle.dumps(e)
+					except Exception:
+						e = RuntimeError('{}: {}'.format(type(e).__name__, e))
+					results.put((sequence, None, e))
+
+		# Returns every shard's matches for input_word, in lexical database order.
+		# Entry words in exclude are skipped (i.e. the trial word during cross-validation).
+		# Re-raises a worker's exception, and raises RuntimeError if a worker has died.
+		# Replies to an earlier call that was interrupted (e.g. by batch.time_limit) are discarded.
+		def populate(self, input_word, exclude=()):
+			import queue
+			if not self.workers:
+				raise ValueError('MatcherPool has been closed.')
+			self.sequence += 1
+			for tasks in self.tasks:
+				tasks.put((self.sequence, input_word, tuple(exclude)))
+			matches = []
+			error = None
+			for worker, results in zip(self.workers, self.results):
+				while True:
+					try:
+						sequence, shard_matches, shard_error = results.get(timeout=1)
+					except queue.Empty:
+						if not worker.is_alive():
+							raise RuntimeError('MatcherPool worker {} died with exit code {}.'.format(worker.pid, worker.exitcode))
+						continue
+					if sequence == self.sequence:
+						break
+				if shard_error is not None:
+					error = error or shard_error
+				else:
+					matches.extend(shard_matches)
+			# Every shard has replied, so none of this call's replies are left queued.
+			if error is not None:
+				raise error
+			return matches
+
+		def close(self):
+			for tasks in self.tasks:
+				tasks.put(None)
+			for worker in self.workers:
+				worker.join()
+			for queue in self.tasks + self.results:
+				queue.close()
+			self.workers, self.tasks, self.results = [], [], []
 
-		list_of_lists_of_matches = [p.get() for p in processes]
-		matches = [item for sublist in list_of_lists_of_matches for item in sublist]
+		def __enter__(self):
+			return self
+
+		def __exit__(self, *exc):
+			self.close()
+
+	# An inverted index from each letter bigram to the lexicon entries containing it.
+	# Every match is at least two letters long, so an entry sharing no bigram with the input word
+	# can never produce one, and the legacy matchers need not visit it.
+	# For partial matching, postings also record each bigram's position, since the two words are
+	# only compared at offsets that keep the shorter word inside the longer one.
+	# Candidates are returned in the index's lexicon order, so matches come out in the same order
+	# as a full scan. Pass lexical_database to drop entries missing from it (i.e. during cross-validation).
+	class BigramIndex:
+		def __init__(self, lexical_database):
+			self.entries = list(lexical_database)
+			self.lengths = [len(entry_word) for entry_word in self.entries]
+			self.postings = {}			# bigram -> [(entry_id, position), ...]
+			self.entry_postings = {}	# bigram -> [entry_id, ...]
+			for entry_id, entry_word in enumerate(self.entries):
+				for position in range(len(entry_word) - 1):
+					bigram = entry_word[position:position + 2]
+					self.postings.setdefault(bigram, []).append((entry_id, position))
+					ids = self.entry_postings.setdefault(bigram, [])
+					if not ids or ids[-1] != entry_id:
+						ids.append(entry_id)
+
+		def words(self, entry_ids, lexical_database=None):
+			entry_words = [self.entries[entry_id] for entry_id in sorted(entry_ids)]
+			if lexical_database is None:
+				return entry_words
+			return [entry_word for entry_word in entry_words if entry_word in lexical_database]
+
+		# Entries sharing a bigram with input_word anywhere (complete matching).
+		def candidates(self, input_word, lexical_database=None):
+			entry_ids = set()
+			for bigram in set(input_word[i:i + 2] for i in range(len(input_word) - 1)):
+				entry_ids.update(self.entry_postings.get(bigram, ()))
+			return self.words(entry_ids, lexical_database)
+
+		# Entries sharing a bigram with input_word at some offset populate_legacy visits (partial matching).
+		def aligned_candidates(self, input_word, lexical_database=None):
+			n = len(input_word)
+			lengths = self.lengths
+			entry_ids = set()
+			for q in range(n - 1):
+				for entry_id, p in self.postings.get(input_word[q:q + 2], ()):
+					if entry_id in entry_ids:
+						continue
+					m = lengths[entry_id]
+					# a is always the longer word; the offset is a's index minus b's.
+					offset = q - p if n >= m else p - q
+					if 0 <= offset <= abs(n - m):
+						entry_ids.add(entry_id)
+			return self.words(entry_ids, lexical_database)
+
+	# Populates pl from the lexical database across multiple processes.
+	# Pass a MatcherPool to reuse its workers; otherwise one is started and closed for this word.
+	@staticmethod
+	def manage_batch_populate(pl, input_word, lexical_database, substring_database, verbose=False, pool=None):
+		if pool is None:
+			with OldPatternMatcher.MatcherPool(lexical_database, substring_database) as pool:
+				return OldPatternMatcher.manage_batch_populate(pl, input_word, lexical_database, substring_database, verbose, pool)
+		# The pool's shards hold the whole lexicon. A lexical database lacking the input word
+		# is a cross-validation trial, so hide that word from the workers as well.
+		from exclusionview import ExclusionView
+		exclude = () if input_word in lexical_database else (input_word,)
+		if isinstance(lexical_database, ExclusionView):
+			exclude = tuple(lexical_database.excluded)
+		matches = pool.populate(input_word, exclude)
 		for match in matches:
 			if match == []:
 				continue
@@ -122,66 +256,49 @@ class OldPatternMatcher:
 				else:
 					add_entry(substring, i, bigger_word, length_difference)
 		# Remove matches that are substrings of larger matches.
-		matches_to_exclude = set()
+		# A child can only lie inside a parent if it is shorter and its (input index, entry index)
+		# interval sits within the parent's on both words, so sort the matches by those intervals
+		# and sweep each parent's input range instead of comparing every pair.
+		# Short ones cannot possibly have substrings, so there is nothing to remove without a longer one.
+		if all(len(match[0]) < 3 for match in matches):
+			return [match[:-1] for match in matches]
+		from bisect import bisect_left, bisect_right
+		# Ascending (input index, entry index, length):
+		order = sorted(range(len(matches)), key=lambda n: (matches[n][2], matches[n][4], len(matches[n][0])))
+		sorted_indices = [matches[n][2] for n in order]
+		excluded = set() # Positions within matches.
 		if verbose:
 			print('Removing duplicates for "{}":'.format(entry_word))
-		for i, match in enumerate(matches):
-			letters, phonemes, index, _, entry_index = match
+		for parent in matches:
+			letters, phonemes, index, _, entry_index = parent
 			# Short ones cannot possibly have substrings.
 			if len(letters) < 3:
 				continue
-
-			potential_parent = '{}({}) ii:{} ei:{}'.format(letters, phonemes, index, entry_index)
-			matches_without_i = matches[:i] + matches[i + 1:]
-			for other_match in matches_without_i:
-				other_letters, other_phonemes, other_index, _, other_entry_index = other_match
-				potential_child = '{}({}) ii:{} ei:{}'.format(other_letters, other_phonemes, other_index, other_entry_index)
-				# 0. Already excluded.
-				if other_match in matches_to_exclude:
-					if verbose:
-						print('Skipping because {} already has been proven to be a substring.'.format(potential_child))
+			# 1. Children start within the parent's input range, at least one letter before its end.
+			first = bisect_left(sorted_indices, index)
+			last = bisect_right(sorted_indices, index + len(letters) - 2)
+			for n in order[first:last]:
+				if n in excluded:
 					continue
-				# 1. Length greater than or equal to match's cannot possibly be match's substring.
+				other_letters, other_phonemes, other_index, _, other_entry_index = matches[n]
+				# 2. Length greater than or equal to match's cannot possibly be match's substring.
 				if len(other_letters) >= len(letters):
-					if verbose:
-						print('Skipping because {}\'s length {} is greater than {}\'s length {}'.format( \
-							potential_child, len(other_letters), potential_parent, len(letters)))
 					continue
-				# 2. Letters outside match's input range indicate other_ cannot possibly be match's substring.
-				if other_index < index or index + len(letters) < other_index + len(other_letters):
-					if verbose:
-						print('{} < {} or {} + {} < {} + {}'.format(other_index, index, index, len(letters), other_index, len(other_letters)))
-						print('Skipping because {} lies outside of {}\'s bounds.'.format( \
-							potential_child, potential_parent))
+				# 3. Letters outside match's input range indicate other_ cannot possibly be match's substring.
+				if index + len(letters) < other_index + len(other_letters):
 					continue
-				# 3. We need to disambiguate between identical entry word substrings as well: Only one of the two "ng"s in entry "jingsheng" are children of "ing".
+				# 4. We need to disambiguate between identical entry word substrings as well: Only one of the two "ng"s in entry "jingsheng" are children of "ing".
 				if other_entry_index < entry_index or entry_index + len(letters) < other_entry_index + len(other_letters):
-					if verbose:
-						print('{} < {} or {} + {} < {} + {}'.format(other_index, index, index, len(letters), other_index, len(other_letters)))
-						print('Skipping because {} lies outside of {}\'s ENTRY INDEX bounds.'.format( \
-							potential_child, potential_parent))
-					continue
-				# 4. BOTH ends equal cannot possibly be a substring, because they're the same length.
-				# The difference between this condition and the last is the "AND."
-				if other_index == index and index + len(letters) == other_index + len(other_letters):
-					if verbose:
-						print('Skipping because {} encompasses {}.'.format( \
-							potential_child, potential_parent))
 					continue
 				# 5. Check if the phonemes map on to each other.
-				start = other_index - index # We know other_index >= index.
-				end = other_index - index + len(other_letters) # Algebra on the second condition above tells us this HAS to be less than len(letters).
-				if phonemes[start:end] != other_phonemes:
-					if verbose:
-						print('Skipping because {}\'s phonemes do not match {}\'s (sliced: {}).'.format( \
-							potential_child, potential_parent, phonemes[start:end]))
+				start = other_index - index
+				if phonemes[start:start + len(other_letters)] != other_phonemes:
 					continue
-
 				if verbose:
-					print('{} is a substring of {}'.format(other_match, match))
-				matches_to_exclude.add(other_match)
-		# We exclude the last element, entry_index, because it was only used to avoid overpruning duplicates in condition 3 above.
-		return list([match[:-1] for match in matches if match not in matches_to_exclude])
+					print('{} is a substring of {}'.format(matches[n], parent))
+				excluded.add(n)
+		# We exclude the last element, entry_index, because it was only used to avoid overpruning duplicates in condition 4 above.
+		return [match[:-1] for n, match in enumerate(matches) if n not in excluded]
 
 	# The original method of Dedina and Nusbaum. Words begin left-aligned and end right-aligned.
 	# Given some word (input_word) we wish to pronounce alongside some entry_word and its phonemes,
@@ -225,13 +342,20 @@ class OldPatternMatcher:
 
 	# A group of words to be run by a single process.
 	# Assumes legacy method if three arguments are passed, else uses precalculated.
+	# Entry words in exclude are skipped. Given a BigramIndex over entry_dict_batch, only its candidates are visited.
 	@staticmethod
-	def populate_batch(input_word, entry_dict_batch, substrings_dict_batch=None):
+	def populate_batch(input_word, entry_dict_batch, substrings_dict_batch=None, exclude=(), index=None):
 		func = OldPatternMatcher.populate_legacy
 		if substrings_dict_batch != None:
 			func = OldPatternMatcher.populate_precalculated_legacy
+		entry_words = entry_dict_batch
+		if index is not None:
+			entry_words = index.aligned_candidates(input_word, entry_dict_batch) if substrings_dict_batch == None \
+				else index.candidates(input_word, entry_dict_batch)
 		matches = []
-		for entry_word in entry_dict_batch:
+		for entry_word in entry_words:
+			if entry_word in exclude:
+				continue
 			if substrings_dict_batch == None:
 				matches += func(input_word, entry_word, entry_dict_batch[entry_word])
 			else:
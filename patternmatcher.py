@@ -271,8 +271,10 @@ class PatternMatcher:
 	# For cross-validation.
 	# This is kind of like un-blending a smoothie.
 	# If the entire input word exists in the dict, we must first decrement its alternate domain representation
-	# from the entry (deleting the entire entry if its was the only such representation.)
-	# Then do the same thing for all its substrings (decrementing or deleting substrings' alt domain representations)
+	# from the entry. Then do the same thing for all its substrings.
+	# Representations decremented to zero are kept at zero rather than deleted (populate_optimized skips them),
+	# so that replace() restores the dict's original order and results never depend on which words were
+	# left out before.
 
 	# Don't forget to add it back later!
 	# Returns true if removed. Returns false if it didn't exist in the first place.
@@ -299,12 +301,8 @@ class PatternMatcher:
 				print('Warning. The input word\'s provided alternate domain representation was at count zero. This should never happen.')
 			elif count == 1:
 				if verbose:
-					print('Removing input word\'s alternate domain representation {} from entry.'.format(sub_altrep))
-				del entry[sub_altrep]
-				if len(entry) == 0:
-					if verbose:
-						print('That was the only representation. Removing {} from main dict as well.'.format(sub_input))
-					del self.substring_to_alt_domain_count_dict[sub_input]
+					print('Zeroing input word\'s alternate domain representation {} in entry.'.format(sub_altrep))
+				entry[sub_altrep] = 0
 			else:
 				# We only decrement.
 				if verbose:
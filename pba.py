@@ -5,13 +5,48 @@
 from lattice import Lattice, ERRORS
 from patternmatcher import PatternMatcher
 from oldpatternmatcher import OldPatternMatcher
+from exclusionview import ExclusionView
+from substringview import SubstringView
+import logging
+
+logger = logging.getLogger(__name__)
 
 USE_EXPERIMENTAL_PATTERNMATCHER = True
 # Takes longer, but potentially yields better results by linking certain phonemes to word borders.
 # Attempting to pronounce "the" without padding yields "D-R", but with padding yields (correctly) "D-x".
 MULTIPROCESS_LEGACY = False
+# The PronouncerByAnalogy loaded by each cross_validate_parallel worker process.
+worker = None
 
 class PronouncerByAnalogy:
+	# One word's outcome from decode or pronounce_batch.
+	class Pronunciation:
+		def __init__(self, word, strategy=None, pronunciation=None, alternatives=None, timings=None, error=None, sizes=None):
+			self.word = word
+			# The strategy whose candidate was chosen, and that candidate's pronunciation.
+			self.strategy = strategy
+			self.pronunciation = pronunciation
+			# Every strategy mapped to its pronunciation.
+			self.alternatives = alternatives if alternatives is not None else {}
+			# Seconds spent per stage (see pronounce).
+			self.timings = timings if timings is not None else {}
+			# Lattice sizes and match and path counts (see pronounce).
+			self.sizes = sizes if sizes is not None else {}
+			# Description of the error when there is no pronunciation.
+			self.error = error
+		# The same outcome under another strategy, if it has one.
+		def choose(self, strategy):
+			if self.error is not None or strategy == self.strategy or strategy not in self.alternatives:
+				return self
+			return PronouncerByAnalogy.Pronunciation(self.word, strategy, self.alternatives[strategy], self.alternatives, self.timings, sizes=self.sizes)
+		# The record handed to a metrics hook (see metrics.Metrics).
+		def event(self):
+			return {'word': self.word, 'timings': self.timings, 'sizes': self.sizes, 'error': self.error}
+		def __str__(self):
+			return self.pronunciation if self.error is None else self.error
+		def __repr__(self):
+			return 'Pronunciation({}, {}, {})'.format(self.word, self.strategy, self.pronunciation if self.error is None else self.error)
+
 	@staticmethod
 	def pad_if(s, padding):
 		# Assume we're not padding.
@@ -21,273 +56,519 @@ class PronouncerByAnalogy:
 			s = '#{}#'.format(s)
 		return s
 
-	def cross_validate(self, start=0, pad=True):
+	# Every trial is journaled to Data/Results_<run_name>.jsonl (see evaluation.Journal), which defaults to a timestamp.
+	# Pass an interrupted run's name to resume it from its last completed trial with the same totals.
+	def cross_validate(self, start=0, pad=None, run_name=None, checkpoint_every=100):
 		from datetime import datetime
 		from collections.abc import Iterable
-		now = datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
-		total = 0
-		trial = start
+		from evaluation import Tally, Journal
+		import os
+		pad = self.padding(pad)
+		if run_name is None:
+			run_name = datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
+		if not os.path.exists('Data'):
+			os.makedirs('Data')
 		ldb = self.lexical_database_pad if pad else self.lexical_database
 		wordlist = list(ldb.keys())
 
 		trial_count = len(wordlist) - 1
 		trial_word = ''
 		ground_truth = ''
-		# Map the strategy name to the titular stat.
-		words_correct = {}
-		words_total = {}
-		phonemes_correct = {}
-		phonemes_total = {}
-		with open('Data/Results_{}.txt'.format(now), 'w', encoding='latin-1') as f:
-			def end_trial(output):
-				nonlocal trial
-				f.write(output)
-				trial += 1
-			# Iterate the occurrences of this error. Return the line to append to the file.
-			def count_error(code):
-				description = ERRORS[code]
-				PronouncerByAnalogy.simple_print(code)
-				# Log instance of error code.
-				words_total[description] = words_total.get(description, 0) + 1
-				# Print results.
-				return '{}, {}\n\n'.format(description, words_total.get(description, 0))
-
+		with Journal('Data/Results_{}.jsonl'.format(run_name), Tally('phonemes'), checkpoint_every) as journal:
+			trial = journal.resume(start)
 			while trial < trial_count:
-				output = ''
-				i = 0
-				skipped = False
-				
 				trial_word = wordlist[trial]
-				output += 'TRIAL {}, {}\n'.format(trial, trial_word)
 				ground_truth = ldb.get(trial_word, '')
 				if ground_truth == '':
 					# The wordlist has a word that is not in this dict.
 					trial += 1
-					#print(trial, trial_count, trial_word)
 					continue
 				print('Loading trial #{}: {} ({})...'.format(trial, trial_word, ground_truth))
 
+				record = {'trial': trial, 'word': trial_word, 'ground_truth': ground_truth}
 				results = self.cross_validate_pronounce(trial_word, pad=pad)
 				if not isinstance(results, Iterable):
 					# Print the error.
-					error_code = results
-					output += count_error(error_code)
-					end_trial(output)
+					PronouncerByAnalogy.simple_print(results)
+					record['error'] = results
+					journal.write(record)
+					trial += 1
 					continue
 
+				record['results'] = {key: results[key].pronunciation for key in results}
+				journal.write(record)
 				for key in results:
-					method = key
-					phoneme_correct = 0
-					total_phonemes = 0
-					# Iterate words for which this trial had a result.
-					words_total[key] = words_total.get(key, 0) + 1
-					# Evaluate that result.
-					if results[key].pronunciation == ground_truth:
-						words_correct[key] = words_correct.get(key, 0) + 1
-					# Iterate phonemes for which this trial had a result.
-					for index, ch in enumerate(results[key].pronunciation):
-						# Total always iterates.
-						phonemes_total[key] = phonemes_total.get(key, 0) + 1
-						if index < len(ground_truth) and ch == ground_truth[index]:
-							# Correct only when correct.
-							phonemes_correct[key] = phonemes_correct.get(key, 0) + 1
-				for key in results:
-					output += '{}, {}, {}, {}, {}\n'.format(key, words_correct.get(key, 0), words_total.get(key, 0), \
-						phonemes_correct.get(key, 0), phonemes_total.get(key, 0))
-					print('{}: {}, {}. {}/{} words correct ({:.2f}%), {}/{} phonemes correct ({:.2f}%)'.format(key, results[key].pronunciation, results[key].pronunciation == ground_truth, words_correct.get(key, 0), words_total.get(key, 0), \
-						100*words_correct.get(key, 0)/words_total.get(key, 1), phonemes_correct.get(key, 0), phonemes_total.get(key, 0), 100*phonemes_correct.get(key, 0)/phonemes_total.get(key, 0)))
-				output += '\n'
-				end_trial(output)
-				# Total only increments after a nonskipped trial.
-				total += 1
-				#print('{} / {} ({}%) Correct'.format(correct_count, total, 100*correct_count/total))
-
-				#print('Guess: {}\nGround truth: {}'.format(best, ground_truth))
-				#print('{} vs. {}'.format(ground_truth, best[0]))
+					print('{}: {}, {}. {}'.format(key, results[key].pronunciation, results[key].pronunciation == ground_truth, journal.tally.describe(key)))
+				trial += 1
 				print()
-
-	# skip_every is -1 (disabled) or >= 2. Generates smaller datasets for easier testing.
-	def __init__(self, output_folder, dataset_filename, skip_every=-1, offset=0, verbose=False):
-		import loader as l
+		return journal.tally
+
+	# Leave-one-out cross-validation of the same trials as cross_validate, spread over a pool of processes.
+	# Trials are dispatched longest word first, in chunks that shrink as the remaining work does, so
+	# whichever worker is idle takes the next chunk and the slowest words never straggle at the end.
+	# Each worker appends one JSON record per trial to Data/Results_<timestamp>_worker-<pid>.jsonl.
+	# Returns the merged Tally, whose summary is also written to Data/Results_<timestamp>.txt.
+	def cross_validate_parallel(self, start=0, pad=None, processes=None):
+		from datetime import datetime
+		import multiprocessing as mp
+		from evaluation import Tally
 		import os
+		pad = self.padding(pad)
+		now = datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
+		if processes is None:
+			processes = mp.cpu_count()
+		if not os.path.exists('Data'):
+			os.makedirs('Data')
+		ldb = self.lexical_database_pad if pad else self.lexical_database
+		wordlist = list(ldb.keys())
+		# The same trials as cross_validate.
+		trials = [(trial, wordlist[trial]) for trial in range(start, len(wordlist) - 1)]
+		trials.sort(key=lambda t: len(t[1]), reverse=True)
+		chunks = PronouncerByAnalogy.chunk_trials(trials, processes)
+
+		tally = Tally('phonemes')
+		completed = 0
+		with mp.Pool(processes, initializer=PronouncerByAnalogy.init_worker, \
+			initargs=(self.output_folder, self.dataset_filename, self.skip_every, self.offset, now)) as pool:
+			for records in pool.imap_unordered(PronouncerByAnalogy.cross_validate_chunk, [(chunk, pad) for chunk in chunks]):
+				for record in records:
+					tally.add_record(record)
+				completed += len(records)
+				print('{}/{} trials complete.'.format(completed, len(trials)))
+		with open('Data/Results_{}.txt'.format(now), 'w', encoding='latin-1') as f:
+			for key in tally.words_total:
+				f.write(tally.line(key))
+		tally.print_summary()
+		return tally
+
+	# Splits trials (sorted longest first) into chunks for workers to take as they become idle.
+	# Each chunk holds about 1/(4*processes) of the remaining work, estimating a word's cost
+	# by the square of its length, so chunks start small and grow as the words get shorter.
+	@staticmethod
+	def chunk_trials(trials, processes):
+		costs = [len(word)**2 for _, word in trials]
+		remaining = sum(costs)
+		chunks = []
+		chunk = []
+		chunk_cost = 0
+		for trial, cost in zip(trials, costs):
+			chunk.append(trial)
+			chunk_cost += cost
+			if chunk_cost >= remaining/(4*processes):
+				chunks.append(chunk)
+				remaining -= chunk_cost
+				chunk = []
+				chunk_cost = 0
+		if chunk:
+			chunks.append(chunk)
+		return chunks
+
+	# Each worker process loads its own PronouncerByAnalogy from the saved artifacts.
+	# Cross-validation workers (given now) also get their own results file.
+	@staticmethod
+	def init_worker(output_folder, dataset_filename, skip_every, offset, now=None):
+		import os
+		global worker
+		worker = PronouncerByAnalogy(output_folder, dataset_filename, skip_every, offset)
+		if now is not None:
+			worker.results_path = 'Data/Results_{}_worker-{}.jsonl'.format(now, os.getpid())
+
+	# Each word_pool worker loads only the artifacts for its padding and matcher, and is sent nothing but words.
+	@staticmethod
+	def init_word_worker(output_folder, dataset_filename, skip_every, offset, pad, matcher, beam_width):
+		global worker
+		worker = PronouncerByAnalogy(output_folder, dataset_filename, skip_every, offset, pad=pad, matcher=matcher, beam_width=beam_width)
 
+	# Runs decode in a word_pool worker. args are (word, timeout, lookup). Choose another strategy from the result's alternatives.
+	@staticmethod
+	def decode_in_worker(args):
+		word, timeout, lookup = args
+		return worker.decode(word, worker.pad, timeout=timeout, lookup=lookup)
+
+	# Runs a chunk of (trial, word) pairs in a worker. Returns their records.
+	@staticmethod
+	def cross_validate_chunk(args):
+		import json
+		from collections.abc import Iterable
+		chunk, pad = args
+		ldb = worker.lexical_database_pad if pad else worker.lexical_database
+		records = []
+		with open(worker.results_path, 'a', encoding='latin-1') as f:
+			for trial, word in chunk:
+				record = {'trial': trial, 'word': word, 'ground_truth': ldb[word]}
+				results = worker.cross_validate_pronounce(word, pad=pad)
+				if isinstance(results, Iterable):
+					record['results'] = {key: results[key].pronunciation for key in results}
+				else:
+					record['error'] = results
+				f.write(json.dumps(record) + '\n')
+				f.flush()
+				records.append(record)
+		return records
+
+	# Artifacts are loaded (or built and saved) on first access rather than up front: each attribute
+	# maps to its file name prefix and padding.
+	ARTIFACTS = {
+		'lexical_database': ('ld', False),
+		'lexical_database_pad': ('ld', True),
+		'substring_database': ('sd', False),
+		'substring_database_pad': ('sd', True),
+		'pm': ('optimized', False),
+		'pm_pad': ('optimized', True),
+		# Serves words already in the lexicon, padded or not (see decode).
+		'answer_table': ('at', False),
+	}
 
+	# skip_every is -1 (disabled) or >= 2. Generates smaller datasets for easier testing.
+	# pad (True or False) sets the padding used when a method isn't told otherwise. matcher is 'optimized' (PatternMatcher)
+	# or 'legacy' (OldPatternMatcher), overriding USE_EXPERIMENTAL_PATTERNMATCHER. Given pad, the artifacts that padding
+	# (and matcher, if given) needs are loaded now; nothing else is ever touched unless asked for.
+	# Given beam_width, decode and cross_validate_pronounce search lattices by beam (see Lattice.find_paths_by_beam).
+	def __init__(self, output_folder, dataset_filename, skip_every=-1, offset=0, verbose=False, pad=None, matcher=None, beam_width=None):
+		import os
+		self.output_folder = output_folder
 		self.dataset_filename = dataset_filename
 		self.skip_every = skip_every
 		self.offset = offset
+		self.pad = pad
+		self.matcher = matcher
+		self.beam_width = beam_width
+		# Called with every word's Pronunciation.event() by decode, i.e. a metrics.Metrics.
+		self.metrics = None
 
 		self.pl = None
-		print('Loading lexical database...')
-		# Assign Lexical Database.
-		lines = 0
-
-		def format_name(prefix, f, use_padding):
-			nonlocal skip_every
-			nonlocal offset
-			formatted_name = '{}_{}_padding-{}'.format(prefix, f, use_padding)
-			# Append the skip factor if applicable.
-			formatted_name = formatted_name + '_skipping-every-' + str(skip_every) if skip_every != -1 else formatted_name
-			# Append offset if applicable.
-			formatted_name = formatted_name + '_offset-' + str(offset) if offset != 0 else formatted_name
-			return formatted_name
-
-		ld_name = format_name("ld", dataset_filename, False)
-		ldp_name = format_name("ld", dataset_filename, True)
-		sd_name = format_name("sd", dataset_filename, False)
-		sdp_name = format_name("sd", dataset_filename, True)
-
 		if not os.path.exists(output_folder):
 			os.makedirs(output_folder)
+		if pad is not None:
+			self.artifact('lexical_database_pad' if pad else 'lexical_database')
+			if matcher == 'optimized':
+				self.artifact('pm_pad' if pad else 'pm')
+			elif matcher == 'legacy':
+				self.artifact('substring_database_pad' if pad else 'substring_database')
+
+		# OldPatternMatcher.MatcherPools for MULTIPROCESS_LEGACY, keyed by padding. Started on first use.
+		self.matcher_pools = {}
+		# OldPatternMatcher.BigramIndexes for the legacy matchers, keyed by padding. Built on first use.
+		self.bigram_indices = {}
+		# VectorizedMatchers for partial matching, keyed by padding. Built on first use.
+		self.vectorized_matchers = {}
+		# Process pools decoding whole words, keyed by padding. Started on first use.
+		self.word_pools = {}
+
+	def format_name(self, prefix, use_padding):
+		formatted_name = '{}_{}_padding-{}'.format(prefix, self.dataset_filename, use_padding)
+		# Append the skip factor if applicable.
+		formatted_name = formatted_name + '_skipping-every-' + str(self.skip_every) if self.skip_every != -1 else formatted_name
+		# Append offset if applicable.
+		formatted_name = formatted_name + '_offset-' + str(self.offset) if self.offset != 0 else formatted_name
+		return formatted_name
+
+	# Only called for attributes not yet set, so each artifact is loaded on first access.
+	def __getattr__(self, name):
+		if name in PronouncerByAnalogy.ARTIFACTS:
+			return self.artifact(name)
+		raise AttributeError(name)
+
+	# Loads the named artifact from output_folder, building and saving it first if needed.
+	def artifact(self, name):
+		import loader as l
+		if name in self.__dict__:
+			return self.__dict__[name]
+		prefix, padded = PronouncerByAnalogy.ARTIFACTS[name]
+		artifact_name = self.format_name(prefix, padded)
+		if prefix == 'optimized':
+			ldb = self.lexical_database_pad if padded else self.lexical_database
+			data = PatternMatcher(ldb, self.output_folder, artifact_name, padded, self.skip_every, self.offset)
+		elif prefix == 'sd':
+			# Sliced on demand from the lexical database, so there is nothing to load or save.
+			data = SubstringView(self.lexical_database_pad if padded else self.lexical_database)
+		elif prefix == 'at':
+			from answertable import AnswerTable
+			import os
+			path = self.output_folder + artifact_name
+			if os.path.exists(path):
+				data = AnswerTable(path)
+			else:
+				print('Building answer table {} in folder {}'.format(artifact_name, self.output_folder))
+				# Either padding will do, so avoid loading the other.
+				ldb = self.__dict__.get('lexical_database_pad', None)
+				data = AnswerTable.build(ldb if ldb is not None else self.lexical_database, path)
+		else:
+			data = l.load(self.output_folder, artifact_name)
+			if data is None:
+				data = self.read_dataset(padded)
+				# Save a copy of the dataset.
+				l.write(self.output_folder, artifact_name, data)
+		setattr(self, name, data)
+		return data
+
+	# Reads the lexical database for this padding from the dataset's text file.
+	def read_dataset(self, padded):
+		lexical_database = {}
+		lines = 0
+		print('Loading lexical database from text...')
+		# Load the input data.
+		with open('Preprocessing/Out/{}.txt'.format(self.dataset_filename), 'r', encoding='latin-1') as f:
+			for i, line in enumerate(f):
+				# Skip every skip_every words.
+				if self.skip_every != -1 and (i + self.offset)%self.skip_every != 0:
+					continue
 
-		self.lexical_database = l.load(output_folder, ld_name)
-		self.lexical_database_pad = l.load(output_folder, ldp_name)
-		self.substring_database = l.load(output_folder, sd_name)
-		self.substring_database_pad = l.load(output_folder, sdp_name)
-
-		if self.lexical_database is None or self.lexical_database_pad is None \
-		or self.substring_database is None or self.substring_database_pad is None:
-			self.lexical_database = {}
-			self.substring_database = {}
-			self.lexical_database_pad = {}
-			self.substring_database_pad = {}
-			print('Loading lexical databases from text...')
-			# Load the input data.
-			with open('Preprocessing/Out/{}.txt'.format(dataset_filename), 'r', encoding='latin-1') as f:
-				def add_entry(lex, sub, a, b):
-					lex[a] = b
-					sub[a] = [[a[i:j] for j in range(i, len(a) + 1) \
-						if j - i > 1] for i in range(0, len(a) - 1)]
-
-				for i, line in enumerate(f):
-					# Skip every skip_every words.
-					if skip_every != -1 and (i + offset)%skip_every != 0:
-						continue
-
-					if lines%10000 == 0:
-						print('{} lines loaded...'.format(lines))
-					line = line.split()
-					# Add padded and nonpadded versions.
-					add_entry(self.lexical_database, self.substring_database, line[0], line[1])
-					add_entry(self.lexical_database_pad, self.substring_database_pad, '#{}#'.format(line[0]), '${}$'.format(line[1]))
-					lines += 1
-			print('{} lines loaded.'.format(lines))
-			# Save a copy of the dataset.
-			l.write(output_folder, ld_name, self.lexical_database)
-			l.write(output_folder, ldp_name, self.lexical_database_pad)
-			l.write(output_folder, sd_name, self.substring_database)
-			l.write(output_folder, sdp_name, self.substring_database_pad)
-
-		pm_name = format_name("optimized", dataset_filename, False)
-		pmp_name = format_name("optimized", dataset_filename, True)
-		self.pm = PatternMatcher(self.lexical_database, output_folder, pm_name, False, skip_every, offset)
-		self.pm_pad = PatternMatcher(self.lexical_database_pad, output_folder, pmp_name, True, skip_every, offset)
+				if lines%10000 == 0:
+					print('{} lines loaded...'.format(lines))
+				line = line.split()
+				if padded:
+					lexical_database['#{}#'.format(line[0])] = '${}$'.format(line[1])
+				else:
+					lexical_database[line[0]] = line[1]
+				lines += 1
+		print('{} lines loaded.'.format(lines))
+		return lexical_database
+
+	# The padding to use when a method is given None.
+	def padding(self, pad):
+		if pad is not None:
+			return pad
+		return self.pad if self.pad is not None else True
+
+	# Whether to match with PatternMatcher (True) or OldPatternMatcher (False).
+	def uses_optimized(self):
+		if self.matcher is not None:
+			return self.matcher == 'optimized'
+		return USE_EXPERIMENTAL_PATTERNMATCHER
+
+	# Returns the vectorized partial matcher over the lexical database for this padding, building it if needed.
+	def vectorized_matcher(self, pad=True):
+		from vectorizedmatcher import VectorizedMatcher
+		if pad not in self.vectorized_matchers:
+			ldb = self.lexical_database_pad if pad else self.lexical_database
+			self.vectorized_matchers[pad] = VectorizedMatcher(ldb)
+		return self.vectorized_matchers[pad]
+
+	# Returns the bigram index over the lexical database for this padding, building it if needed.
+	def bigram_index(self, pad=True):
+		if pad not in self.bigram_indices:
+			ldb = self.lexical_database_pad if pad else self.lexical_database
+			self.bigram_indices[pad] = OldPatternMatcher.BigramIndex(ldb)
+		return self.bigram_indices[pad]
+
+	# Returns the long-lived legacy matcher pool for this padding, starting it if needed.
+	def matcher_pool(self, pad=True):
+		if pad not in self.matcher_pools:
+			ldb = self.lexical_database_pad if pad else self.lexical_database
+			sdb = self.substring_database_pad if pad else self.substring_database
+			self.matcher_pools[pad] = OldPatternMatcher.MatcherPool(ldb, sdb)
+		return self.matcher_pools[pad]
+
+	# Returns the long-lived pool of processes that decode whole words for this padding, starting it if needed.
+	# processes (by default, one per CPU) only applies when the pool is started.
+	def word_pool(self, pad=True, processes=None):
+		import multiprocessing as mp
+		if pad not in self.word_pools:
+			self.word_pools[pad] = mp.Pool(processes if processes is not None else mp.cpu_count(), \
+				initializer=PronouncerByAnalogy.init_word_worker, \
+				initargs=(self.output_folder, self.dataset_filename, self.skip_every, self.offset, pad, \
+				'optimized' if self.uses_optimized() else 'legacy', self.beam_width))
+		return self.word_pools[pad]
+
+	# Shuts down any worker processes.
+	def close(self):
+		for pool in self.matcher_pools.values():
+			pool.close()
+		self.matcher_pools = {}
+		for pool in self.word_pools.values():
+			pool.close()
+			pool.join()
+		self.word_pools = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
 
 
 	# Removes input word from the dataset before pronouncing if present.
-	def cross_validate_pronounce(self, input_word, verbose=False, pad=True):
+	def cross_validate_pronounce(self, input_word, verbose=False, pad=None):
+		pad = self.padding(pad)
 		input_word = PronouncerByAnalogy.pad_if(input_word, pad)
 		ldb = self.lexical_database_pad if pad else self.lexical_database
-		sdb = self.substring_database_pad if pad else self.substring_database
-
-		trimmed_lexical_database = {}
-		trimmed_substring_database = {}
-		answer = ''
-		found = False
-		for word in ldb.keys():
-			if word != input_word:
-				trimmed_lexical_database[word] = ldb[word]
-				trimmed_substring_database[word] = sdb[word]
-			else:
-				found = True
-				answer = ldb[word]
-				if verbose and not USE_EXPERIMENTAL_PATTERNMATCHER:
-					print('Removed {} ({}) from dataset.'.format(input_word, answer))
-		if not found:
+		# Only the legacy matchers read the substring database.
+		sdb = None
+		if not self.uses_optimized():
+			sdb = self.substring_database_pad if pad else self.substring_database
+
+		# Hide the input word from the matchers without copying the databases.
+		trimmed_lexical_database = ExclusionView(ldb, [input_word])
+		trimmed_substring_database = ExclusionView(sdb, [input_word]) if sdb is not None else None
+		answer = ldb.get(input_word, '')
+		if input_word in ldb:
+			if verbose and not self.uses_optimized():
+				print('Removed {} ({}) from dataset.'.format(input_word, answer))
+		else:
 			print('The dataset did not have {}.'.format(input_word))
 
 		pm = None
-		if USE_EXPERIMENTAL_PATTERNMATCHER:
+		if self.uses_optimized():
 			pm = self.pm_pad if pad else self.pm
 			# Can't remove a word unless we have its representation.
 			if answer != '':
 				pm.remove(input_word, answer)
 
-		results = PronouncerByAnalogy.pronounce(input_word, trimmed_lexical_database, trimmed_substring_database, verbose=False, pm=pm)
+		pool = self.matcher_pool(pad) if MULTIPROCESS_LEGACY and pm is None else None
+		index = self.bigram_index(pad) if pm is None else None
+		results = PronouncerByAnalogy.pronounce(input_word, trimmed_lexical_database, trimmed_substring_database, verbose=False, pm=pm, pool=pool, index=index, beam_width=self.beam_width)
 		if verbose:
 			PronouncerByAnalogy.simple_print(results, answer)
 
-		if USE_EXPERIMENTAL_PATTERNMATCHER:
+		if self.uses_optimized():
 			# Add back the word, but only if we removed it in the first place.
 			if answer != '':
 				pm.replace(input_word, answer)
 
 		return results
 
-	def pronounce_sentence(self, input_sentence, multiprocess_words=False, pad=True):
+	def pronounce_sentence(self, input_sentence, multiprocess_words=False, pad=None):
 		import time
+		pad = self.padding(pad)
 		time_before = time.perf_counter()
 		processed_sentence = input_sentence.lower()
 		processed_sentence = ''.join([ch for ch in processed_sentence if ch in ' abcdefghijklmnopqrstuvwxyz'])
 		input_words = processed_sentence.split()
-		output_sentence = []
-		# Results will be a list of dicts. Each dict represents a set of evaluation methods mapped to their top candidate
-		# for that word.
-		results_list = []
-		pm = None
-		if USE_EXPERIMENTAL_PATTERNMATCHER:
-			pm = self.pm_pad if pad else self.pm
-
-		ldb = self.lexical_database_pad if pad else self.lexical_database
-		sdb = self.substring_database_pad if pad else self.substring_database
-
+		# One Pronunciation per word, each holding its top candidate for strategy 10100 (or its only result).
 		if not multiprocess_words:
-			for word in input_words:
-				word = PronouncerByAnalogy.pad_if(word, pad)
-				results_list.append(PronouncerByAnalogy.pronounce(word, ldb, sdb, pm=pm))
+			results_list = [self.decode(word, pad) for word in input_words]
 		else:
-			import multiprocessing as mp
-			num_processes = mp.cpu_count()
-			pool = mp.Pool(processes=num_processes)
-			results_list = pool.starmap(PronouncerByAnalogy.pronounce, \
-				([word, self.lexical_database, self.substring_database, pm] \
-				for word in input_words))
-		# pronounce returns a dict of entries AND a float value.
-		for candidates_dict in results_list:
-			for key in candidates_dict:
-				if len(candidates_dict) == 1 or key == '10100':
-					# Convert from Candidate back to string.
-					result = candidates_dict[key].pronunciation \
-					if type(candidates_dict[key]) == Lattice.Candidate else candidates_dict[key]
-					output_sentence.append(result)
-					continue
+			# Words are decoded by this instance's word pool, which stays up for later sentences.
+			results_list = self.word_pool(pad).map(PronouncerByAnalogy.decode_in_worker, [(word, None, True) for word in input_words])
+		output_sentence = [str(result) for result in results_list]
 
 		time_after = time.perf_counter()
-		print('Sentence pronounced in {} seconds'.format(time_after - time_before))
+		logger.debug('Sentence pronounced in %f seconds', time_after - time_before)
 		print('{}:'.format(input_sentence))
 		print(' '.join(output_sentence))
 		return
 
+	# Pronounces one word with this instance's matchers, returning a Pronunciation.
+	# strategy names the result to choose (see Lattice.decide). Results without it, like bypass, have only one.
+	# With lookup, words in the lexicon are answered from the answer table (under the strategy 'lexicon')
+	# and only the rest are decoded by analogy.
+	# Words taking longer than timeout seconds (None for no limit) are abandoned with an error.
+	# The Pronunciation is also handed (as an event) to this instance's metrics hook, if it has one.
+	def decode(self, input_word, pad=None, strategy='10100', timeout=None, lookup=True):
+		result = self.decode_unobserved(input_word, pad, strategy, timeout, lookup)
+		if self.metrics is not None:
+			self.metrics(result.event())
+		return result
+
+	def decode_unobserved(self, input_word, pad, strategy, timeout, lookup):
+		import time
+		from collections.abc import Iterable
+		from batch import time_limit
+		pad = self.padding(pad)
+		if input_word.strip('#') == '':
+			return PronouncerByAnalogy.Pronunciation(input_word, error='No letters to pronounce.')
+		if lookup:
+			time_before = time.perf_counter()
+			answer = self.answer_table.get(input_word)
+			duration = time.perf_counter() - time_before
+			if answer is not None:
+				answer = '${}$'.format(answer) if pad else answer
+				return PronouncerByAnalogy.Pronunciation(input_word, 'lexicon', answer, {'lexicon': answer}, {'lookup': duration, 'total': duration})
+		pm = None
+		sdb = None
+		if self.uses_optimized():
+			pm = self.pm_pad if pad else self.pm
+		else:
+			sdb = self.substring_database_pad if pad else self.substring_database
+		ldb = self.lexical_database_pad if pad else self.lexical_database
+		pool = self.matcher_pool(pad) if MULTIPROCESS_LEGACY and pm is None else None
+		index = self.bigram_index(pad) if pm is None else None
+
+		timings = {}
+		sizes = {}
+		time_before = time.perf_counter()
+		try:
+			with time_limit(timeout):
+				results = PronouncerByAnalogy.pronounce(PronouncerByAnalogy.pad_if(input_word, pad), ldb, sdb, pm=pm, pool=pool, index=index, timings=timings, sizes=sizes, beam_width=self.beam_width)
+		except TimeoutError:
+			timings['total'] = time.perf_counter() - time_before
+			return PronouncerByAnalogy.Pronunciation(input_word, timings=timings, error='Timed out after {} seconds.'.format(timeout), sizes=sizes)
+		timings['total'] = time.perf_counter() - time_before
+		if not isinstance(results, Iterable):
+			return PronouncerByAnalogy.Pronunciation(input_word, timings=timings, error=ERRORS.get(results, str(results)), sizes=sizes)
+		# Convert from Candidate back to string.
+		alternatives = {key: results[key].pronunciation if type(results[key]) == Lattice.Candidate else results[key] for key in results}
+		chosen = strategy if strategy in alternatives else next(iter(alternatives))
+		return PronouncerByAnalogy.Pronunciation(input_word, chosen, alternatives[chosen], alternatives, timings, sizes=sizes)
+
+	# Lowercases a word and drops anything that isn't a letter, as pronounce_sentence does.
+	@staticmethod
+	def normalize(word):
+		return ''.join([ch for ch in word.lower() if ch in 'abcdefghijklmnopqrstuvwxyz'])
+
+	# Pronounces every word of an iterable, yielding one Pronunciation per word in input order.
+	# Words are normalized, then streamed window at a time with each window's distinct words decoded
+	# once (see batch.stream, which also describes cache). With parallel set, distinct words are
+	# decoded by this instance's word pool (see word_pool). timeout is in seconds per word.
+	# lookup is as in decode. Results are cached under their padding and lookup as well as their word, but
+	# not under this instance's own settings (i.e. its matcher or lexicon): use a cache with one instance's settings only.
+	def pronounce_batch(self, words, pad=None, strategy='10100', cache=None, parallel=False, window=256, timeout=None, lookup=True):
+		import batch
+		pad = self.padding(pad)
+		imap = None
+		if parallel:
+			pool = self.word_pool(pad)
+			imap = lambda pending: pool.imap(PronouncerByAnalogy.decode_in_worker, [(word, timeout, lookup) for word in pending])
+		words = (PronouncerByAnalogy.normalize(word) for word in words)
+		# Cached results may have been chosen under another strategy.
+		# Normalized words are letters alone, so the prefix can't be mistaken for part of one.
+		key = lambda word: 'pad={},lookup={}:{}'.format(pad, lookup, word)
+		for result in batch.stream(words, lambda word: self.decode(word, pad, strategy, timeout, lookup), cache, window, imap, key):
+			yield result.choose(strategy)
+
 	def test_pronounce(self, input_word, lexical_database, substring_database, verbose=False, attempt_bypass=False, pm=None):
-		results, duration, lattice = PronouncerByAnalogy.pronounce(input_word, lexical_database, substring_database, verbose=verbose, attempt_bypass=attempt_bypass, pm=pm, test_mode=True)
+		index = self.bigram_index(lexical_database is self.lexical_database_pad) if pm is None else None
+		results, duration, lattice = PronouncerByAnalogy.pronounce(input_word, lexical_database, substring_database, verbose=verbose, attempt_bypass=attempt_bypass, pm=pm, test_mode=True, index=index)
 		if verbose:
 			print('Completed in {} seconds.'.format(duration))
 			PronouncerByAnalogy.simple_print(results)
 		return results, duration, lattice
 
 	# Setting test_mode to True returns lattice for testing.
+	# pool is an OldPatternMatcher.MatcherPool over lexical_database, used when MULTIPROCESS_LEGACY is set.
+	# index is an OldPatternMatcher.BigramIndex over (a superset of) lexical_database, letting the
+	# legacy matcher skip entries that share no bigram with input_word.
+	# vectorized is a VectorizedMatcher over (a superset of) lexical_database, for partial matching.
+	# Pass a dict as timings to have it filled with the seconds spent per stage, as each stage finishes:
+	#   lookup        (with attempt_bypass) finding input_word in the lexicon
+	#   populate      matching against the lexicon to build the lattice
+	#   search        the breadth-first search for shortest paths
+	#   gap_patching  linking over gaps the search could not cross (see Lattice.link_silences)
+	#   heuristics    scoring and ranking candidates by each heuristic
+	#   fusion        combining those rankings (see Lattice.rank_by_heuristics)
+	#   decide        heuristics and fusion together
+	# Pass a dict as sizes to have it filled with the lattice's 'matches', 'nodes' and 'arcs', and the search's
+	# 'paths', 'iterations' and 'gap_patches'.
+	# Given beam_width, the lattice is searched by beam instead of exhaustively (see Lattice.find_paths_by_beam).
 	@staticmethod
-	def pronounce(input_word, lexical_database, substring_database, pm, verbose=False, attempt_bypass=False, test_mode=False):
+	def pronounce(input_word, lexical_database, substring_database, pm, verbose=False, attempt_bypass=False, test_mode=False, pool=None, index=None, vectorized=None, timings=None, sizes=None, beam_width=None):
 		# Check if we're using pad.
-		uses_padding = list(lexical_database)[0].startswith('#')
+		uses_padding = next(iter(lexical_database)).startswith('#')
 		input_word = PronouncerByAnalogy.pad_if(input_word, uses_padding)
 		import time
+		if timings is None:
+			timings = {}
+		if sizes is None:
+			sizes = {}
 
+		time_before = time.perf_counter()
 		if attempt_bypass and input_word in lexical_database:
-			time_before = time.perf_counter()
 			results = {'bypass': lexical_database[input_word]}
 			time_after = time.perf_counter()
 			if verbose:
 				PronouncerByAnalogy.simple_print(results)
+			timings['lookup'] = time_after - time_before
 			if test_mode:
 				results = (results, time_after - time_before, None)
 			return results
@@ -300,9 +581,41 @@ class PronouncerByAnalogy:
 		# Bigrams unrepresented in the dataset will cause gaps in lattice paths.
 		#pl.flag_unrepresented_bigrams(input_word, lexical_database)
 
+		if attempt_bypass:
+			timings['lookup'] = time.perf_counter() - time_before
 		# Populate lattice.
-		match_count = 0
 		time_before = time.perf_counter()
+		match_count = PronouncerByAnalogy.populate(pl, input_word, lexical_database, substring_database, pm, pool, index, vectorized)
+		if verbose:
+			print('{} matches found.'.format(match_count))
+		time_after = time.perf_counter()
+		duration = time_after - time_before
+		logger.debug('Lattice populated in %f seconds', duration)
+		timings['populate'] = duration
+		sizes.update(matches=match_count, nodes=len(pl.nodes), arcs=len(pl.arcs))
+
+		# Filled in as they finish, so a word abandoned mid-search still reports what it got through.
+		pl.timings = timings
+		pl.stats = sizes
+		candidates = pl.find_all_paths() if beam_width is None else pl.find_paths_by_beam(beam_width)
+		time_after_search = time.perf_counter()
+		results = pl.decide(candidates)
+		if pl.timings.get('heuristics') is not None:
+			timings['decide'] = time.perf_counter() - time_after_search
+		# Gap patching adds arcs.
+		sizes['arcs'] = len(pl.arcs)
+		# Print with no regard for ground truth.
+		if verbose:
+			PronouncerByAnalogy.simple_print(results)
+		if test_mode:
+			return results, duration, pl
+		return results
+
+	# Adds every match for input_word to lattice pl using the matcher selected by pronounce's arguments.
+	# Returns the number of matches added.
+	@staticmethod
+	def populate(pl, input_word, lexical_database, substring_database, pm, pool=None, index=None, vectorized=None):
+		match_count = 0
 		# New, optimized method with current PatternMatcher.
 		if pm is not None:
 			matches = pm.populate_optimized(input_word, verbose=False)
@@ -312,32 +625,29 @@ class PronouncerByAnalogy:
 				pl.add_forced(*match)
 		# OldPatternMatcher with multiprocessing.
 		elif MULTIPROCESS_LEGACY:
-			pl, matches = OldPatternMatcher.manage_batch_populate(pl, \
-				input_word, lexical_database, substring_database, verbose=False)
+			pl, match_count = OldPatternMatcher.manage_batch_populate(pl, \
+				input_word, lexical_database, substring_database, verbose=False, pool=pool)
+		# Partial matching against the whole lexicon at once.
+		elif vectorized is not None:
+			for match in vectorized.populate(input_word, lexical_database):
+				pl.add(*match)
+				match_count += 1
 		# OldPatternMatcher without multiprocessing.
+		# Without a substring database, this falls back to partial matching.
 		else:
-			for entry_word in lexical_database:
+			entry_words = lexical_database
+			if index is not None and substring_database is None:
+				entry_words = index.aligned_candidates(input_word, lexical_database)
+			elif index is not None:
+				entry_words = index.candidates(input_word, lexical_database)
+			for entry_word in entry_words:
 				phonemes = lexical_database[entry_word] 
-				substrings = substring_database[entry_word]
+				substrings = None if substring_database is None else substring_database[entry_word]
 				matches = OldPatternMatcher.populate(input_word, entry_word, phonemes, substrings)
 				for match in matches:
 					pl.add(*match)
 					match_count += 1
-		if verbose:
-			print('{} matches found.'.format(match_count))
-		time_after = time.perf_counter()
-		duration = time_after - time_before
-		print('Lattice populated in {} seconds'.format(duration))
-
-
-		candidates = pl.find_all_paths()
-		results = pl.decide(candidates)
-		# Print with no regard for ground truth.
-		if verbose:
-			PronouncerByAnalogy.simple_print(results)
-		if test_mode:
-			return results, duration, pl
-		return results
+		return match_count
 
 	# Given a dict of string labels (describing a strategy) mapped to candidates
 	# arrived at via that strategy, print.
@@ -356,14 +666,16 @@ class PronouncerByAnalogy:
 			print('{}: {}, {}'.format(result, results[result], evaluation))
 		print('Ground truth: {}'.format(ground_truth))
 	def compare_experimental(self, input_word, verbose=False, pad=True):
+		ldb = self.lexical_database_pad if pad else self.lexical_database
+		sdb = self.substring_database_pad if pad else self.substring_database
 		pm = None
 		# Old method.
 		print('Old method:')
-		results1, dur1, lattice1 = pba.test_pronounce(input_word, self.lexical_database, self.substring_database, verbose=False, pm=pm)
+		results1, dur1, lattice1 = self.test_pronounce(input_word, ldb, sdb, verbose=False, pm=pm)
 		pm = self.pm_pad if pad else self.pm
 		# New, experimental method.
 		print('Experimental:')
-		results2, dur2, lattice2 = pba.test_pronounce(input_word, self.lexical_database, self.substring_database, verbose=False, pm=pm)
+		results2, dur2, lattice2 = self.test_pronounce(input_word, ldb, sdb, verbose=False, pm=pm)
 
 		# Compare lattices.
 		Lattice.print_lattice_comparison(lattice1, lattice2)
@@ -375,6 +687,8 @@ class PronouncerByAnalogy:
 		print('Same answers? {}. Speedup: {}x faster.'.format(results1==results2, dur1/dur2))
 
 if __name__ == "__main__":
+	# Show each stage's progress and timings.
+	logging.basicConfig(level=logging.DEBUG, format='%(message)s')
 	USE_EXPERIMENTAL_PATTERNMATCHER = True
 	MULTIPROCESS_LEGACY = False
 
@@ -3,122 +3,102 @@
 # "Can syllabification improve pronunciation by analogy of English?
 
 from lattice import Lattice, ERRORS
+from oldpatternmatcher import OldPatternMatcher
+from exclusionview import ExclusionView
+from substringview import SubstringView
+
+# The SyllabifierByAnalogy loaded by each syllabify_batch worker process.
+worker = None
 
 class SyllabifierByAnalogy():
+	# Artifacts are saved as <PREFIX>-lexicon_... and <PREFIX>-optimized_..., and cross-validation results as
+	# Data/<RESULTS>_<run_name>.jsonl. Subclasses decoding other representations (see joint.py) override these.
+	PREFIX = 'sba'
+	RESULTS = 'Syllabification_Results'
 
-	def cross_validate(self, start=0):
+	# Every trial is journaled to Data/<RESULTS>_<run_name>.jsonl (see evaluation.Journal), which
+	# defaults to a timestamp. Pass an interrupted run's name to resume it from its last completed trial.
+	def cross_validate(self, start=0, run_name=None, checkpoint_every=100):
 		from datetime import datetime
 		from collections.abc import Iterable
+		from evaluation import Journal
 		import os
-		now = datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
-		total = 0
-		trial = start
-		trial_count = len(self.lexical_database) - 1
+		if run_name is None:
+			run_name = datetime.today().strftime('%Y-%m-%d-%H-%M-%S')
+		keys = list(self.lexical_database.keys())
+		trial_count = len(keys) - 1
 		trial_word = ''
 		ground_truth = ''
-		# Map the strategy name to the titular stat.
-		words_correct = {}
-		words_total = {}
-		junctures_correct = {}
-		junctures_total = {}
 
 		if not os.path.exists('Data'):
 			os.makedirs('Data')
 
-		with open('Data/Syllabification_Results_{}.txt'.format(now), 'w', encoding='latin-1') as f:
-			def end_trial(output):
-				nonlocal trial
-				f.write(output)
-				trial += 1
-			# Iterate the occurrences of this error. Return the line to append to the file.
-			def count_error(code):
-				description = ERRORS[code]
-				self.simple_print(code)
-				# Log instance of error code.
-				words_total[description] = words_total.get(description, 0) + 1
-				# Print results.
-				return '{}, {}\n\n'.format(description, words_total.get(description, 0))
-
+		with Journal('Data/{}_{}.jsonl'.format(self.RESULTS, run_name), self.tally(), checkpoint_every) as journal:
+			trial = journal.resume(start)
 			while trial < trial_count:
-				output = ''
-				i = 0
-				skipped = False
-				
-				keys = list(self.lexical_database.keys())
-
 				trial_word = keys[trial]
-				#trial_word = self.add_junctures(trial_word)
-				output += 'TRIAL {}, {}\n'.format(trial, trial_word)
-				ground_truth = self.lexical_database[trial_word]
+				ground_truth = self.junctured(trial_word, self.lexical_database[trial_word])
 				print('Loading trial #{}: {} ({})...'.format(trial, trial_word, ground_truth))
 
+				record = {'trial': trial, 'word': trial_word, 'ground_truth': ground_truth}
 				results = self.cross_validate_syllabify(trial_word)
 				if not isinstance(results, Iterable):
 					# Print the error.
-					error_code = results
-					output += count_error(error_code)
-					end_trial(output)
+					self.simple_print(results)
+					record['error'] = results
+					journal.write(record)
+					trial += 1
 					continue
 
+				record['results'] = {key: results[key].pronunciation for key in results}
+				journal.write(record)
 				for key in results:
-					# Iterate words for which this trial had a result.
-					words_total[key] = words_total.get(key, 0) + 1
-					# Evaluate that result.
-					if results[key].pronunciation == ground_truth:
-						words_correct[key] = words_correct.get(key, 0) + 1
-					# Iterate JUNCTURES for which this trial had a result.
-					for index, ch in enumerate(results[key].pronunciation):
-						# Skip non-junctures.
-						if ch not in '|*':
-							continue
-						# Total always iterates.
-						junctures_total[key] = junctures_total.get(key, 0) + 1
-						if index < len(ground_truth) and ch == ground_truth[index]:
-							# Correct only when correct.
-							junctures_correct[key] = junctures_correct.get(key, 0) + 1
-				for key in results:
-					output += '{}, {}, {}, {}, {}\n'.format(key, words_correct.get(key, 0), words_total.get(key, 0), \
-						junctures_correct.get(key, 0), junctures_total.get(key, 0))
-					print('{}: {}, Correct?: {}. {}/{} words correct ({:.2f}%), {}/{} junctures correct ({:.2f}%)'.format( \
-						key, results[key].pronunciation, results[key].pronunciation == ground_truth, \
-						words_correct.get(key, 0), words_total.get(key, 0), 100*words_correct.get(key, 0)/words_total.get(key, 1), \
-						junctures_correct.get(key, 0), junctures_total.get(key, 0), 100*junctures_correct.get(key, 0)/junctures_total.get(key, 0)))
-				output += '\n'
-				end_trial(output)
-				# Total only increments after a nonskipped trial.
-				total += 1
+					print('{}: {}, Correct?: {}. {}'.format(key, results[key].pronunciation, results[key].pronunciation == ground_truth, \
+						journal.tally.describe(key)))
+				trial += 1
 				print()
+		return journal.tally
+
+	# Only junctures are scored.
+	def tally(self):
+		from evaluation import Tally
+		return Tally('junctures', '|*')
 
 	# Removes input word from the dataset before pronouncing if present.
 	# Returns a dict of string labels per strategy mapped to pronunciation results.
 	def cross_validate_syllabify(self, input_word, verbose=False):
-		input_word = self.add_junctures(input_word)
+		input_word = self.key(input_word)
 
-		trimmed_lexical_database = {}
-		trimmed_substring_database = {}
+		# Hide the input word without copying the databases.
+		trimmed_lexical_database = ExclusionView(self.lexical_database, [input_word])
+		trimmed_substring_database = ExclusionView(self.substring_database, [input_word])
 
-		answer = ''
-		found = False
-		for word in self.lexical_database.keys():
-			if word != input_word:
-				trimmed_lexical_database[word] = self.lexical_database[word]
-				trimmed_substring_database[word] = self.substring_database[word]
-			else:
-				found = True
-				answer = self.lexical_database[word]
-				if verbose:
-					print('Removed {} ({}) from dataset.'.format(input_word, answer))
-		if not found:
+		answer = self.lexical_database.get(input_word, '')
+		if input_word in self.lexical_database:
+			if verbose:
+				print('Removed {} ({}) from dataset.'.format(input_word, answer))
+		else:
 			print('The dataset did not have {}.'.format(input_word))
-		results = self.syllabify(input_word, (trimmed_lexical_database, trimmed_substring_database), verbose=False)
+		# The optimized index can't be viewed around a word, so take the word out and put it back afterward.
+		if self.matcher == 'optimized' and answer != '':
+			self.pm.remove(input_word, answer)
+		results = self.syllabify_representation(input_word, (trimmed_lexical_database, trimmed_substring_database), verbose=False)
+		if self.matcher == 'optimized' and answer != '':
+			self.pm.replace(input_word, answer)
 		if verbose:
-			self.simple_print(results, answer)
+			self.simple_print(results, self.junctured(input_word, answer))
 
 		return results
 
+	# Returns a dict of string labels per strategy mapped to syllabification results (see Lattice.decide).
 	def syllabify(self, input_word, trimmed_databases=None, verbose=False):
-		# Junctures added?
-		input_word = self.add_junctures(input_word)
+		return self.syllabify_representation(input_word, trimmed_databases, verbose)
+
+	# As syllabify, but with results in this class's own representation (see represent). A subclass representing
+	# more than syllabification overrides syllabify, decode and syllabify_batch to convert results from it.
+	def syllabify_representation(self, input_word, trimmed_databases=None, verbose=False):
+		# Junctures added (or, when compact, taken away)?
+		input_word = self.key(input_word)
 
 		# Default to the database loaded in the constructor.
 		lexical_database = self.lexical_database
@@ -246,17 +226,104 @@ class SyllabifierByAnalogy():
 						#print('{} will be added later...'.format(prev_matching_substring))
 				if prev_matching_substring != NO_MATCH:
 					add_entry(prev_matching_substring, bigger_word, length_difference)
-		for entry_word in lexical_database:
-			syllable_domain = lexical_database[entry_word]
-			#populate_precalculated()
-			populate_legacy()
-		candidates = self.pl.find_all_paths()
+		if self.matcher == 'optimized':
+			# Each match comes with its count, so no entry is visited.
+			for match in self.pm.populate_optimized(input_word):
+				self.pl.add_forced(*match)
+		elif self.matcher == 'vectorized':
+			for match in self.vectorized_matcher.populate(input_word, lexical_database):
+				self.pl.add(*match)
+		else:
+			# Only entries sharing an aligned bigram with input_word can produce a partial match.
+			for entry_word in self.bigram_index.aligned_candidates(input_word, lexical_database):
+				syllable_domain = lexical_database[entry_word]
+				#populate_precalculated()
+				populate_legacy()
+		candidates = self.pl.find_all_paths() if self.beam_width is None else self.pl.find_paths_by_beam(self.beam_width)
 		results = self.pl.decide(candidates)
+		if self.compact and isinstance(results, dict):
+			# Strategies may share a candidate, so expand each only once.
+			expanded = set()
+			for result in results.values():
+				if id(result) not in expanded:
+					result.pronunciation = self.expand(input_word, result.pronunciation)
+					expanded.add(id(result))
 		# Print with no regard for ground truth.
 		if verbose:
 			self.simple_print(results)
 		return results
 
+	# Syllabifies one word, returning a PronouncerByAnalogy.Pronunciation (whose pronunciation is the junctured word).
+	# strategy names the result to choose (see Lattice.decide). Words taking longer than timeout seconds are abandoned.
+	def decode(self, input_word, strategy='10100', timeout=None):
+		return self.decode_representation(input_word, strategy, timeout)
+
+	# As decode, but with the result in this class's own representation (see syllabify_representation).
+	def decode_representation(self, input_word, strategy='10100', timeout=None):
+		import time
+		from collections.abc import Iterable
+		from batch import time_limit
+		from pba import PronouncerByAnalogy
+		if input_word.strip('#*') == '':
+			return PronouncerByAnalogy.Pronunciation(input_word, error='No letters to syllabify.')
+		timings = {}
+		sizes = {}
+		# Whatever stages the lattice got through (see PronouncerByAnalogy.pronounce).
+		def measure():
+			if self.pl is not None:
+				timings.update(self.pl.timings)
+				sizes.update(self.pl.stats, nodes=len(self.pl.nodes), arcs=len(self.pl.arcs))
+			timings['total'] = time.perf_counter() - time_before
+		self.pl = None
+		time_before = time.perf_counter()
+		try:
+			with time_limit(timeout):
+				results = self.syllabify_representation(input_word)
+		except TimeoutError:
+			measure()
+			return PronouncerByAnalogy.Pronunciation(input_word, timings=timings, error='Timed out after {} seconds.'.format(timeout), sizes=sizes)
+		measure()
+		if not isinstance(results, Iterable):
+			return PronouncerByAnalogy.Pronunciation(input_word, timings=timings, error=ERRORS.get(results, str(results)), sizes=sizes)
+		alternatives = {key: results[key].pronunciation for key in results}
+		chosen = strategy if strategy in alternatives else next(iter(alternatives))
+		return PronouncerByAnalogy.Pronunciation(input_word, chosen, alternatives[chosen], alternatives, timings, sizes=sizes)
+
+	# Syllabifies every word of an iterable, yielding one Pronunciation per word in input order
+	# (see PronouncerByAnalogy.pronounce_batch). Given processes, distinct words are decoded across
+	# that many worker processes, each loading its own copy of this lexicon. Results (and cache) are in this
+	# class's own representation (see decode_representation).
+	def syllabify_batch(self, words, strategy='10100', cache=None, processes=None, window=256, timeout=None):
+		import batch
+		import multiprocessing as mp
+		from pba import PronouncerByAnalogy
+		words = (PronouncerByAnalogy.normalize(word) for word in words)
+		if processes is None:
+			for result in batch.stream(words, lambda word: self.decode_representation(word, strategy, timeout), cache, window):
+				yield result.choose(strategy)
+			return
+		with mp.Pool(processes, initializer=SyllabifierByAnalogy.init_worker, initargs=(type(self), self.settings())) as pool:
+			imap = lambda pending: pool.imap(SyllabifierByAnalogy.decode_in_worker, [(word, timeout) for word in pending])
+			for result in batch.stream(words, None, cache, window, imap):
+				yield result.choose(strategy)
+
+	# The keyword arguments constructing an equivalent syllabifier, i.e. in a worker process.
+	def settings(self):
+		return {'path': self.path, 'matcher': self.matcher, 'skip_every': self.skip_every, 'offset': self.offset, \
+			'beam_width': self.beam_width, 'output_folder': self.output_folder, 'compact': self.compact}
+
+	# syllabifier is the class to construct (SyllabifierByAnalogy or a subclass), given settings.
+	@staticmethod
+	def init_worker(syllabifier, settings):
+		global worker
+		worker = syllabifier(**settings)
+
+	# args are (word, timeout).
+	@staticmethod
+	def decode_in_worker(args):
+		word, timeout = args
+		return worker.decode_representation(word, timeout=timeout)
+
 	# It's safe to call this repeatedly.
 	def add_junctures(self, input_word):
 		# Junctures already added?
@@ -275,6 +342,38 @@ class SyllabifierByAnalogy():
 
 		return input_word
 
+	# The lexicon's key for input_word: junctured, or when compact, its letters alone. Also safe to call repeatedly.
+	def key(self, input_word):
+		input_word = self.add_junctures(input_word)
+		if self.compact:
+			return SyllabifierByAnalogy.compact(input_word, input_word)[0]
+		return input_word
+
+	# The compact representation of a junctured key and entry: '#t*e*s*t#', '#t*e|s*t#' -> '#test#', '#**|*#'.
+	# Each letter is marked with the juncture before it (the first with '*'), and the bookends with '#'. A lattice
+	# over the letters alone is half as long, yet every juncture a path decides is still spanned by some arc: the
+	# arc ending at the letter after it.
+	@staticmethod
+	def compact(junctured_key, junctured_entry):
+		letters = junctured_key[1:-1:2]
+		junctures = junctured_entry[2:-1:2]
+		return '#{}#'.format(letters), '#*{}#'.format(junctures)
+
+	# Inverts compact, given the compact key and a marking of its letters. Marks other than '|' (i.e. the '-' of
+	# gap patching) are read as no boundary.
+	@staticmethod
+	def expand(letters, marks):
+		expanded = letters[1]
+		for letter, mark in zip(letters[2:-1], marks[2:-1]):
+			expanded += ('|' if mark == '|' else '*') + letter
+		return '#{}#'.format(expanded)
+
+	# A lexicon entry as junctured, whatever the representation.
+	def junctured(self, key, entry):
+		if self.compact and entry != '':
+			return SyllabifierByAnalogy.expand(key, entry)
+		return entry
+
 	# Given a dict of string labels (describing a strategy) mapped to candidates
 	# arrived at via that strategy, print.
 	def simple_print(self, results, ground_truth=''):
@@ -291,11 +390,11 @@ class SyllabifierByAnalogy():
 			print('{}: {}, {}'.format(result, results[result], evaluation))
 		print('Ground truth: {}'.format(ground_truth))
 
-	def __init__(self, path="Preprocessing/Out/output.txt", verbose=False):
-		# Assign Lexical Database.
-		self.lexical_database = {}
-		self.substring_database = {}
-		with open(path, 'r', encoding='latin-1') as f:
+	# Parses the lexicon file into a lexical database of junctured (or compact) keys and entries.
+	# Returns it with the number of syllable boundaries and of junctures it holds.
+	def read_lexicon(self, verbose=False):
+		lexical_database = {}
+		with open(self.path, 'r', encoding='latin-1') as f:
 			# Determine syllable breaks from each word's encoding.
 			# R1: [<>] denotes [<|>]
 			# R2: [<digit] denotes [<|digit]
@@ -305,7 +404,10 @@ class SyllabifierByAnalogy():
 				'00', '01', '02', '10', '11', '12', '20', '21', '22'])
 			boundary_count = 0
 			juncture_count = 0
-			for line in f:
+			for i, line in enumerate(f):
+				# Skip every skip_every words, as PronouncerByAnalogy does.
+				if self.skip_every != -1 and (i + self.offset)%self.skip_every != 0:
+					continue
 				junctured_key = '' # Every juncture will be a *.
 				junctured_entry = '' # Junctures will be * or |.
 				line = line.split()
@@ -316,14 +418,14 @@ class SyllabifierByAnalogy():
 					continue
 				# Stats
 				# Iterate up to the second-to-last character (we will look ahead by 1 index)
-				for i in range(len(letters) - 1):
+				for j in range(len(letters) - 1):
 					# Add char before potential boundary.
-					junctured_key += letters[i]
-					junctured_entry += letters[i]
+					junctured_key += letters[j]
+					junctured_entry += letters[j]
 					# Add juncture POSSIBILITY to key.
 					junctured_key += '*'
 					# Determine whether a syllable boundary actually exists.
-					potential_boundary = encoding[i] + encoding[i + 1]
+					potential_boundary = encoding[j] + encoding[j + 1]
 					if potential_boundary in boundaries:
 						junctured_entry += '|'
 						boundary_count += 1
@@ -337,22 +439,96 @@ class SyllabifierByAnalogy():
 				junctured_key = '#{}#'.format(junctured_key)
 				junctured_entry = '#{}#'.format(junctured_entry)
 				# Add entry.
-				self.lexical_database[junctured_key] = junctured_entry
-				# Precalculate substrings.
-				self.substring_database[junctured_key] = [[junctured_key[i:j] for j in range(i, len(junctured_key) + 1) \
-					if j - i > 1] for i in range(0, len(junctured_key) - 1)]
+				junctured_key, junctured_entry = self.represent(junctured_key, junctured_entry, line[1])
+				lexical_database[junctured_key] = junctured_entry
 				if verbose:
-					print('{}\n{}\n{}\n\n'.format(junctured_key, junctured_entry, self.substring_database[junctured_key]))
-			if verbose:
-				# M&D logged 24.38% for this figure.
-				print('{} boundaries out of {} junctures ({:.2f}%)'.format(boundary_count, juncture_count, 100*boundary_count/juncture_count))
-
-sba = SyllabifierByAnalogy()
-
-#sba.cross_validate_syllabify('test', verbose=True)
-#sba.cross_validate_syllabify('testing', verbose=True)
-#sba.cross_validate_syllabify('mandatory', verbose=True)
-#sba.cross_validate_syllabify('authoritative', verbose=True)
-#sba.cross_validate_syllabify('national', verbose=True)
-#sba.cross_validate_syllabify('stationery', verbose=True)
-sba.cross_validate()
+					print('{}\n{}\n{}\n\n'.format(junctured_key, junctured_entry, SubstringView(lexical_database)[junctured_key]))
+		return lexical_database, boundary_count, juncture_count
+
+	# The lexicon's key and entry for a word, given it junctured and its aligned phonemes (unused here).
+	def represent(self, junctured_key, junctured_entry, phonemes):
+		if self.compact:
+			return SyllabifierByAnalogy.compact(junctured_key, junctured_entry)
+		return junctured_key, junctured_entry
+
+	# The lexicon file's modification time and size. A cache made from a file with any other is stale.
+	def source(self):
+		import os
+		status = os.stat(self.path)
+		return status.st_mtime_ns, status.st_size
+
+	# The name an artifact made from this lexicon is saved under in output_folder, as PronouncerByAnalogy.format_name.
+	def format_name(self, prefix):
+		import os
+		formatted_name = '{}_{}'.format(prefix, os.path.splitext(os.path.basename(self.path))[0])
+		# Append the skip factor if applicable.
+		formatted_name = formatted_name + '_skipping-every-' + str(self.skip_every) if self.skip_every != -1 else formatted_name
+		# Append offset if applicable.
+		formatted_name = formatted_name + '_offset-' + str(self.offset) if self.offset != 0 else formatted_name
+		return formatted_name
+
+	# matcher is 'optimized' (a PatternMatcher over the junctured lexicon, mapping e.g. "#t*e*s*t#" to "#t*e|s*t#",
+	# built once and saved to output_folder), 'legacy' (partial matching one entry at a time) or 'vectorized'
+	# (the same matches as legacy via NumPy). skip_every and offset prune the lexicon as they do for PronouncerByAnalogy.
+	# Given beam_width, lattices are searched by beam (see Lattice.find_paths_by_beam).
+	# When compact, the lexicon is keyed on letters alone, each marked with the juncture before it (see compact),
+	# halving lattice length. Results are junctured either way.
+	def __init__(self, path="Preprocessing/Out/output.txt", verbose=False, matcher='optimized', skip_every=-1, offset=0, beam_width=None, \
+		output_folder='Data/', compact=False):
+		import os
+		import loader as l
+		self.path = path
+		self.matcher = matcher
+		self.beam_width = beam_width
+		self.skip_every = skip_every
+		self.offset = offset
+		self.output_folder = output_folder
+		self.compact = compact
+		if not os.path.exists(output_folder):
+			os.makedirs(output_folder)
+		# The parsed lexicon is cached beside the optimized index, along with the file it was parsed from.
+		lexicon_name = self.format_name(self.PREFIX + ('-lexicon-compact' if compact else '-lexicon'))
+		source = self.source()
+		lexicon = l.load(output_folder, lexicon_name)
+		stale = lexicon is None or lexicon['source'] != source
+		if stale:
+			lexical_database, boundary_count, juncture_count = self.read_lexicon(verbose)
+			lexicon = {'source': source, 'lexical_database': lexical_database, \
+				'boundary_count': boundary_count, 'juncture_count': juncture_count}
+			l.write(output_folder, lexicon_name, lexicon)
+		# Assign Lexical Database.
+		self.lexical_database = lexicon['lexical_database']
+		self.boundary_count = lexicon['boundary_count']
+		self.juncture_count = lexicon['juncture_count']
+		# Substrings are sliced from the lexical database's keys on demand.
+		self.substring_database = SubstringView(self.lexical_database)
+		if verbose:
+			# M&D logged 24.38% for this figure.
+			print('{} boundaries out of {} junctures ({:.2f}%)'.format(self.boundary_count, self.juncture_count, \
+				100*self.boundary_count/self.juncture_count))
+		index_name = self.format_name(self.PREFIX + ('-optimized-compact' if compact else '-optimized'))
+		# An index built from the old lexicon would otherwise outlive it, whichever matcher re-parsed it.
+		if stale and os.path.exists(output_folder + index_name):
+			os.remove(output_folder + index_name)
+		if matcher == 'optimized':
+			from patternmatcher import PatternMatcher
+			self.pm = PatternMatcher(self.lexical_database, output_folder, index_name, True, skip_every, offset)
+		elif matcher == 'legacy':
+			self.bigram_index = OldPatternMatcher.BigramIndex(self.lexical_database)
+		elif matcher == 'vectorized':
+			from vectorizedmatcher import VectorizedMatcher
+			self.vectorized_matcher = VectorizedMatcher(self.lexical_database)
+
+if __name__ == "__main__":
+	import logging
+	# Show each stage's progress and timings.
+	logging.basicConfig(level=logging.DEBUG, format='%(message)s')
+	sba = SyllabifierByAnalogy()
+
+	#sba.cross_validate_syllabify('test', verbose=True)
+	#sba.cross_validate_syllabify('testing', verbose=True)
+	#sba.cross_validate_syllabify('mandatory', verbose=True)
+	#sba.cross_validate_syllabify('authoritative', verbose=True)
+	#sba.cross_validate_syllabify('national', verbose=True)
+	#sba.cross_validate_syllabify('stationery', verbose=True)
+	sba.cross_validate()
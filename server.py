@@ -0,0 +1,201 @@
+# A prefork pronunciation daemon, so that callers pay for loading the lexicon and its index once.
+# The parent loads everything its padding and matcher need, then forks workers that share it
+# copy-on-write and take turns accepting connections on the same listening socket.
+# Requests and responses are line-delimited JSON, one object per word:
+#   -> {"word": "testing"}                      (optionally with "strategy", "alternatives": true and "lookup": false)
+#   <- {"word": "testing", "pronunciation": "$tEstIG-$", "strategy": "10100", "error": null,
+#       "latency": 0.0021, "in_flight": 1, "worker": 12345}
+# latency is the seconds spent decoding the word, and in_flight the number of requests being decoded
+# across all workers (this one included) when it arrived. Words in the lexicon are answered from its
+# answer table, with strategy "lexicon", unless the request turns lookup off.
+
+#   python server.py serve output --socket /tmp/pba.sock --workers 4
+#   python server.py client --socket /tmp/pba.sock testing quote
+#   cat words.txt | python server.py client --port 8765
+
+# Returns a listening socket: a Unix domain socket at socket_path, or else TCP on host:port.
+def listen(socket_path=None, host='127.0.0.1', port=None, backlog=128):
+	import os
+	import socket
+	if socket_path is not None:
+		if os.path.exists(socket_path):
+			os.remove(socket_path)
+		listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		listener.bind(socket_path)
+	else:
+		listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		listener.bind((host, port))
+	listener.listen(backlog)
+	return listener
+
+def connect(socket_path=None, host='127.0.0.1', port=None):
+	import socket
+	if socket_path is not None:
+		connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		connection.connect(socket_path)
+	else:
+		connection = socket.create_connection((host, port))
+	return connection
+
+# Loads whatever pba will need to decode with this padding, so that forked workers share it.
+def warm(pba, pad):
+	pba.artifact('answer_table')
+	pba.artifact('lexical_database_pad' if pad else 'lexical_database')
+	if pba.uses_optimized():
+		pba.artifact('pm_pad' if pad else 'pm')
+	else:
+		pba.artifact('substring_database_pad' if pad else 'substring_database')
+		pba.bigram_index(pad)
+
+# Answers one request line. in_flight is a shared multiprocessing.Value counting requests being decoded.
+def respond(pba, line, pad, in_flight):
+	import json
+	import os
+	import time
+	from pba import PronouncerByAnalogy
+	try:
+		request = json.loads(line)
+		word = request['word']
+		strategy = request.get('strategy', '10100')
+		lookup = request.get('lookup', True)
+	except (ValueError, KeyError, TypeError, AttributeError):
+		return {'error': 'Expected a JSON object with a "word".'}
+	if not isinstance(word, str) or not isinstance(strategy, str) or not isinstance(lookup, bool):
+		return {'error': 'Expected "word" and "strategy" to be strings, and "lookup" a boolean.'}
+	with in_flight.get_lock():
+		in_flight.value += 1
+		depth = in_flight.value
+	time_before = time.perf_counter()
+	try:
+		result = pba.decode(PronouncerByAnalogy.normalize(word), pad, strategy, lookup=lookup)
+	except Exception as e:
+		# One bad word must not take its worker down with it.
+		return {'word': word, 'error': '{}: {}'.format(type(e).__name__, e)}
+	finally:
+		with in_flight.get_lock():
+			in_flight.value -= 1
+	response = {'word': word, 'pronunciation': result.pronunciation, 'strategy': result.strategy, 'error': result.error, \
+		'latency': time.perf_counter() - time_before, 'in_flight': depth, 'worker': os.getpid()}
+	if request.get('alternatives'):
+		response['alternatives'] = result.alternatives
+	return response
+
+# A worker's loop: serve one connection at a time until the client hangs up, forever.
+def work(pba, listener, pad, in_flight):
+	import json
+	while True:
+		connection, _ = listener.accept()
+		with connection, connection.makefile('rb') as reader, connection.makefile('wb') as writer:
+			try:
+				for line in reader:
+					if not line.strip():
+						continue
+					response = respond(pba, line.decode('latin-1'), pad, in_flight)
+					writer.write((json.dumps(response) + '\n').encode('latin-1'))
+					writer.flush()
+			except (BrokenPipeError, ConnectionResetError):
+				pass
+
+# Forks workers over listener and waits on them, forking a replacement for any worker that dies.
+# Stops them all on SIGINT or SIGTERM.
+def serve(pba, listener, pad=True, workers=None):
+	import multiprocessing as mp
+	import os
+	import signal
+	import socket
+	if workers is None:
+		workers = mp.cpu_count()
+	warm(pba, pad)
+	in_flight = mp.Value('i', 0)
+	children = set()
+
+	def fork():
+		pid = os.fork()
+		if pid == 0:
+			signal.signal(signal.SIGINT, signal.SIG_IGN)
+			signal.signal(signal.SIGTERM, signal.SIG_DFL)
+			try:
+				work(pba, listener, pad, in_flight)
+			finally:
+				os._exit(1)
+		children.add(pid)
+		return pid
+	for _ in range(workers):
+		fork()
+	print('Serving with {} workers: {}'.format(workers, ' '.join(str(pid) for pid in sorted(children))))
+
+	def stop(signum, frame):
+		for pid in list(children):
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:
+				pass
+		raise SystemExit(0)
+	signal.signal(signal.SIGINT, stop)
+	signal.signal(signal.SIGTERM, stop)
+	try:
+		while True:
+			pid, status = os.waitpid(-1, 0)
+			if pid not in children:
+				continue
+			children.discard(pid)
+			print('Worker {} exited with status {}; replaced by {}.'.format(pid, status, fork()), flush=True)
+	finally:
+		if listener.family == socket.AF_UNIX:
+			os.remove(listener.getsockname())
+		listener.close()
+
+# Sends each word and prints "word<TAB>pronunciation<TAB>latency in ms", or the error in place of the pronunciation.
+def client(connection, words, strategy='10100'):
+	import json
+	with connection, connection.makefile('rb') as reader, connection.makefile('wb') as writer:
+		for word in words:
+			word = word.strip()
+			if not word:
+				continue
+			writer.write((json.dumps({'word': word, 'strategy': strategy}) + '\n').encode('latin-1'))
+			writer.flush()
+			response = json.loads(reader.readline().decode('latin-1'))
+			result = response['pronunciation'] if response['error'] is None else response['error']
+			print('{}\t{}\t{:.2f}'.format(word, result, 1000*response['latency']), flush=True)
+
+def main(argv=None):
+	import argparse
+	import sys
+	address = argparse.ArgumentParser(add_help=False)
+	address.add_argument('--socket', help='Path of a Unix domain socket. Otherwise, TCP on --host and --port.')
+	address.add_argument('--host', default='127.0.0.1')
+	address.add_argument('--port', type=int, default=8765)
+	parser = argparse.ArgumentParser(description='Serve pronunciations from a warm, prefork daemon.')
+	commands = parser.add_subparsers(dest='command', required=True)
+	serve_parser = commands.add_parser('serve', parents=[address])
+	serve_parser.add_argument('dataset', help='Dataset name within Preprocessing/Out/, without ".txt".')
+	serve_parser.add_argument('--folder', default='Data/', help='Where loaded and optimized artifacts are cached.')
+	serve_parser.add_argument('--skip-every', type=int, default=-1)
+	serve_parser.add_argument('--offset', type=int, default=0)
+	serve_parser.add_argument('--workers', type=int)
+	serve_parser.add_argument('--no-pad', action='store_true')
+	serve_parser.add_argument('--matcher', choices=['optimized', 'legacy'], default='optimized')
+	serve_parser.add_argument('--beam-width', type=int, help='Search lattices by beam, bounding each word\'s latency.')
+	client_parser = commands.add_parser('client', parents=[address])
+	client_parser.add_argument('words', nargs='*', help='Words to pronounce. Read one per line from stdin if none are given.')
+	client_parser.add_argument('--strategy', default='10100')
+	args = parser.parse_args(argv)
+	if args.command == 'serve' and args.beam_width is not None and args.beam_width < 1:
+		parser.error('--beam-width must be at least 1.')
+
+	if args.command == 'serve':
+		from pba import PronouncerByAnalogy
+		pad = not args.no_pad
+		pba = PronouncerByAnalogy(args.folder, args.dataset, skip_every=args.skip_every, offset=args.offset, pad=pad, matcher=args.matcher, beam_width=args.beam_width)
+		listener = listen(args.socket, args.host, args.port)
+		print('Listening on {}.'.format(args.socket if args.socket is not None else '{}:{}'.format(args.host, args.port)))
+		serve(pba, listener, pad, args.workers)
+	else:
+		client(connect(args.socket, args.host, args.port), args.words if args.words else sys.stdin, args.strategy)
+	return 0
+
+if __name__ == "__main__":
+	import sys
+	sys.exit(main())
@@ -0,0 +1,49 @@
+# Every substring (of two or more letters) of every word in a lexical database, sliced on demand.
+# The substring databases used to hold these as lists of lists, built and pickled for every word up front:
+# the largest structure in the legacy path, although the matchers read each row only until its first miss.
+# SubstringView[word] yields the same rows in the same order, i.e. for "index":
+#   in, ind, inde, index
+#   nd, nde, ndex
+#   de, dex
+#   ex
+
+from collections.abc import Mapping
+
+class SubstringView(Mapping):
+	# One word's substrings. Each row is a generator, so substrings past a row's first miss are never sliced.
+	class Substrings:
+		def __init__(self, word):
+			self.word = word
+
+		def __iter__(self):
+			for i in range(0, len(self.word) - 1):
+				yield SubstringView.Substrings.row(self.word, i)
+
+		def __len__(self):
+			return max(len(self.word) - 1, 0)
+
+		# Substrings beginning at index i, from smallest to largest.
+		@staticmethod
+		def row(word, i):
+			for j in range(i + 2, len(word) + 1):
+				yield word[i:j]
+
+		def __repr__(self):
+			return repr([list(row) for row in self])
+
+	def __init__(self, lexical_database):
+		self.lexical_database = lexical_database
+
+	def __getitem__(self, word):
+		if word not in self.lexical_database:
+			raise KeyError(word)
+		return SubstringView.Substrings(word)
+
+	def __contains__(self, word):
+		return word in self.lexical_database
+
+	def __iter__(self):
+		return iter(self.lexical_database)
+
+	def __len__(self):
+		return len(self.lexical_database)
@@ -0,0 +1,83 @@
+# Dedina & Nusbaum's partial matching (OldPatternMatcher.populate_legacy) over the whole lexicon at once.
+# Rather than comparing characters one at a time per entry word, the lexicon is packed into one
+# uint8 matrix per word length. At every offset, the input word is compared against every entry
+# of that length in a single NumPy operation, and runs of two or more equal characters are read off
+# the boundaries of each row's equality mask.
+
+# Requires NumPy.
+class VectorizedMatcher:
+	def __init__(self, lexical_database):
+		import numpy as np
+		self.entries = list(lexical_database)
+		self.representations = [lexical_database[entry_word] for entry_word in self.entries]
+		# Map each entry length to (entry ids, matrix of those entries' characters).
+		ids_by_length = {}
+		for entry_id, entry_word in enumerate(self.entries):
+			ids_by_length.setdefault(len(entry_word), []).append(entry_id)
+		self.groups = {}
+		for length, ids in ids_by_length.items():
+			letters = ''.join(self.entries[entry_id] for entry_id in ids)
+			matrix = VectorizedMatcher.encode(letters).reshape(len(ids), length)
+			self.groups[length] = (np.array(ids), matrix)
+
+	@staticmethod
+	def encode(s):
+		import numpy as np
+		return np.frombuffer(s.encode('latin-1'), dtype=np.uint8)
+
+	# Returns matches, a list of tuples (match, phonemes, index, entry_word) identical to, and in the same order as,
+	# calling OldPatternMatcher.populate_legacy on every entry word in turn.
+	# Pass lexical_database to drop entries missing from it (i.e. during cross-validation).
+	def populate(self, input_word, lexical_database=None):
+		import numpy as np
+		from numpy.lib.stride_tricks import sliding_window_view
+		n = len(input_word)
+		word = VectorizedMatcher.encode(input_word)
+		# Per match: entry id, offset, index k within the shorter word, length.
+		found = [[], [], [], []]
+		for length, (ids, matrix) in self.groups.items():
+			# a is always the longer word, b the shorter. Stack every offset of b along a into
+			# equality masks of shape (offsets, entries, len(b)).
+			if n >= length:
+				equal = matrix[None, :, :] == sliding_window_view(word, length)[:, None, :]
+			else:
+				equal = sliding_window_view(matrix, n, axis=1).transpose(1, 0, 2) == word[None, None, :]
+			offsets, entries, width = equal.shape
+			# A run starts where a row's mask rises and ends where it falls.
+			bounded = np.zeros((offsets*entries, width + 2), dtype=np.int8)
+			bounded[:, 1:-1] = equal.reshape(offsets*entries, width)
+			edges = np.diff(bounded, axis=1)
+			rows, starts = np.nonzero(edges == 1)
+			_, ends = np.nonzero(edges == -1)
+			# Insufficient length.
+			long_enough = ends - starts > 1
+			rows, starts, ends = rows[long_enough], starts[long_enough], ends[long_enough]
+			found[0].append(ids[rows%entries])
+			found[1].append(rows//entries)
+			found[2].append(starts)
+			found[3].append(ends - starts)
+		# No entries at all (i.e. an empty lexicon).
+		if not found[0]:
+			return []
+		entry_ids, offsets, indices, lengths = (np.concatenate(column) for column in found)
+		# Restore populate_legacy's order: by entry word, then offset, then index.
+		order = np.lexsort((indices, offsets, entry_ids))
+		columns = (column[order].tolist() for column in (entry_ids, offsets, indices, lengths))
+
+		matches = []
+		present = {}
+		for entry_id, offset, index, length in zip(*columns):
+			entry_word = self.entries[entry_id]
+			if lexical_database is not None:
+				if entry_id not in present:
+					present[entry_id] = entry_word in lexical_database
+				if not present[entry_id]:
+					continue
+			phonemes = self.representations[entry_id]
+			if n < len(entry_word):
+				# When the entry word is bigger, phoneme indices "shift right" to remain accurate.
+				matches.append((input_word[index : index + length], phonemes[index + offset : index + offset + length], index, entry_word))
+			else:
+				# When the entry word is smaller, matched indices "shift right" to remain accurate.
+				matches.append((entry_word[index : index + length], phonemes[index : index + length], index + offset, entry_word))
+		return matches